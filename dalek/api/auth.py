@@ -2,6 +2,7 @@ from oslo.config import cfg
 import webob.dec
 import webob.exc
 
+from dalek.api import pipeline as api_pipeline
 from dalek import context
 from dalek.openstack.common import log as logging
 from dalek import wsgi
@@ -27,7 +28,7 @@ def _load_pipeline(loader, pipeline):
     filters.reverse()
     for filter in filters:
         app = filter(app)
-    return app
+    return api_pipeline.flatten(app)
 
 
 def pipeline_factory(loader, global_conf, **local_conf):
@@ -40,12 +41,22 @@ def pipeline_factory(loader, global_conf, **local_conf):
 class AdaptorContext(wsgi.Middleware):
     """Make a request context from keystone headers."""
 
+    # Passes requests on by returning the next application, which lets
+    # the flattened pipeline call it with its own request.
+    request_filter = True
+
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
         user_id = req.headers.get('X_USER_ID')
         user_name = req.headers.get('X_USER_NAME')
         user_password = CONF.auth_password
-        ctx = context.RequestContext(user_id=user_id, user_name=user_name, user_password=user_password)
+        project_id = req.headers.get('X_PROJECT_ID')
+        project_name = req.headers.get('X_PROJECT_NAME')
+        ctx = context.RequestContext(user_id=user_id, user_name=user_name,
+                                     user_password=user_password,
+                                     project_id=project_id,
+                                     project_name=project_name,
+                                     auth_url=None)
 
         req.environ['context'] = ctx
         return self.application
\ No newline at end of file
@@ -25,6 +25,7 @@ import webob.dec
 import webob.exc
 
 from dalek.api.openstack import extensions
+from dalek.api.openstack import pathtrie
 from dalek.api.openstack import wsgi
 from dalek import exception
 from dalek.i18n import _
@@ -169,6 +170,13 @@ class PlainMapper(APIMapper):
                                **kwargs)
 
 
+def _compile_routes(router):
+    """Route the requests of router through a trie of its mapper."""
+    trie = pathtrie.TrieRouter.compile(router.map, router._dispatch)
+    if trie is not None:
+        router._router = trie
+
+
 class APIRouter(base_wsgi.Router):
     """Routes requests on the OpenStack API to the appropriate controller
     and method.
@@ -193,6 +201,7 @@ class APIRouter(base_wsgi.Router):
         self._setup_ext_routes(mapper, ext_mgr, init_only)
         self._setup_extensions(ext_mgr)
         super(APIRouter, self).__init__(mapper)
+        _compile_routes(self)
 
     def _setup_ext_routes(self, mapper, ext_mgr, init_only):
         for resource in ext_mgr.get_resources():
@@ -334,6 +343,7 @@ class APIRouterV21(base_wsgi.Router):
         LOG.info(_LI("Loaded extensions: %s"),
                  sorted(self.loaded_extension_info.get_extensions().keys()))
         super(APIRouterV21, self).__init__(mapper)
+        _compile_routes(self)
 
     def _register_resources_list(self, ext_list, mapper):
         for ext in ext_list:
@@ -50,15 +50,38 @@ _MAX_API_VERSION = "2.1"
 DEFAULT_API_VERSION = _MIN_API_VERSION
 
 
+# Supported version strings parsed by parse()
+_PARSED_VERSIONS = {}
+
+
 # NOTE(cyeoh): min and max versions declared as functions so we can
 # mock them for unittests. Do not use the constants directly anywhere
 # else.
 def min_api_version():
-    return APIVersionRequest(_MIN_API_VERSION)
+    return parse(_MIN_API_VERSION)
 
 
 def max_api_version():
-    return APIVersionRequest(_MAX_API_VERSION)
+    return parse(_MAX_API_VERSION)
+
+
+def parse(version_string):
+    """Return the APIVersionRequest of version_string, parsed only once.
+
+    Requests carry the same few version strings, so supported versions
+    are interned and shared: the returned object must not be modified.
+    """
+    version = _PARSED_VERSIONS.get(version_string)
+    if version is None:
+        version = APIVersionRequest(version_string)
+        # NOTE: only supported versions are kept, so that clients sending
+        # any syntactically valid version cannot grow the table.  The
+        # bounds are parsed here rather than through min_api_version()
+        # and max_api_version(), which call parse().
+        if version.matches(APIVersionRequest(_MIN_API_VERSION),
+                           APIVersionRequest(_MAX_API_VERSION)):
+            _PARSED_VERSIONS[version_string] = version
+    return version
 
 
 class APIVersionRequest(object):
@@ -95,6 +118,9 @@ class APIVersionRequest(object):
         return cmp((self.ver_major, self.ver_minor),
                    (other.ver_major, other.ver_minor))
 
+    def __hash__(self):
+        return hash((self.ver_major, self.ver_minor))
+
     def matches(self, min_version, max_version):
         """Returns whether the version object represents a version
         greater than or equal to the minimum version and less than
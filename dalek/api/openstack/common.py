@@ -432,7 +432,7 @@ class ViewBuilder(object):
         """Get project id from request url if present or empty string
         otherwise
         """
-        project_id = request.environ["dalek.context"].project_id
+        project_id = request.environ["context"].project_id
         if project_id in request.url:
             return project_id
         return ''
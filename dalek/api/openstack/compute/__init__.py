@@ -21,6 +21,7 @@ WSGI middleware for OpenStack Compute API.
 from oslo.config import cfg
 
 import dalek.api.openstack
+from dalek.api.openstack.compute import batch
 from dalek.api.openstack.compute import extensions
 from dalek.api.openstack.compute import servers
 
@@ -35,9 +36,25 @@ class APIRouter(dalek.api.openstack.APIRouter):
 
     def _setup_routes(self, mapper, ext_mgr, init_only):
         self.resources['servers'] = servers.create_resource()
+        mapper.connect("server_reservation",
+                       "/{project_id}/servers/reservations/{id}",
+                       controller=self.resources['servers'],
+                       action='show_reservation',
+                       conditions={"method": ['GET']})
+        mapper.connect("servers_bulk_action",
+                       "/{project_id}/servers/action",
+                       controller=self.resources['servers'],
+                       action='bulk_action',
+                       conditions={"method": ['POST']})
+        self.resources['batch'] = batch.create_resource(self)
+        mapper.connect("batch",
+                       "/{project_id}/batch",
+                       controller=self.resources['batch'],
+                       action='create',
+                       conditions={"method": ['POST']})
         mapper.resource("server", "servers",
                         controller=self.resources['servers'],
                         collection={'detail': 'GET'},
-                        member={'action': 'POST'})
+                        member={'action': 'POST', 'watch': 'GET'})
 
 
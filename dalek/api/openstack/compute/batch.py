@@ -0,0 +1,123 @@
+"""Many API calls in a single HTTP request.
+
+A batch names sub-requests as they would be sent on their own::
+
+    {"requests": [{"method": "GET", "path": "/<project>/servers/<id>"},
+                  {"method": "POST", "path": "/<project>/servers/<id>/action",
+                   "body": {"os-stop": null}}]}
+
+They are dispatched to the API router of the batch itself, with the
+already authenticated context, and run concurrently.  Their responses
+are streamed back in the order of the sub-requests::
+
+    {"responses": [{"status": 200, "body": {...}}, ...]}
+
+Errors of a sub-request become faults as in FaultWrapper, so that its
+status and body are those of the same call made on its own.  The body
+of each sub-request is read whole before it is written out, including
+bodies its endpoint streams, such as server lists: a batch is not meant
+for listings too large to hold in memory.
+"""
+
+import copy
+
+import eventlet
+from oslo.config import cfg
+import six
+import webob
+from webob import exc
+
+from dalek.api import openstack
+from dalek.api.openstack.compute.schemas import batch as schemas
+from dalek.api.openstack import wsgi
+from dalek.i18n import _
+from dalek.i18n import _LE
+from dalek import jsoncodec
+from dalek.openstack.common import log as logging
+
+batch_opts = [
+    cfg.IntOpt('batch_max_requests',
+               default=100,
+               help='Maximum number of sub-requests of a batch request'),
+    cfg.IntOpt('batch_concurrency',
+               default=10,
+               help='Maximum number of sub-requests of a batch request run '
+                    'concurrently'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(batch_opts)
+
+LOG = logging.getLogger(__name__)
+
+# Headers of the batch request passed on to its sub-requests.
+_INHERITED_HEADERS = ('Accept', 'Accept-Language',
+                      wsgi.API_VERSION_REQUEST_HEADER)
+
+
+class BatchController(wsgi.Controller):
+    """Dispatches the sub-requests of batch requests to an API router."""
+
+    def __init__(self, application):
+        super(BatchController, self).__init__()
+        # NOTE: sub-requests skip the middlewares of the batch request,
+        # their exceptions are turned into faults here.
+        self.application = openstack.FaultWrapper(application)
+
+    @wsgi.schema(schemas.batch)
+    def create(self, req, body):
+        if req.environ.get('dalek.batch'):
+            msg = _("Batch requests cannot be nested")
+            raise exc.HTTPBadRequest(explanation=msg)
+        sub_requests = body['requests']
+        if len(sub_requests) > CONF.batch_max_requests:
+            msg = _("A batch may hold at most %d requests") % (
+                CONF.batch_max_requests)
+            raise exc.HTTPBadRequest(explanation=msg)
+
+        pool = eventlet.GreenPool(CONF.batch_concurrency)
+        responses = pool.imap(lambda sub: self._call(req, sub), sub_requests)
+
+        response = webob.Response(content_type='application/json')
+        response.app_iter = self._stream_responses(responses)
+        return response
+
+    def _call(self, req, sub):
+        # NOTE: sub-requests get their own context, as dispatching sets its
+        # project and API version.
+        environ = {'context': copy.copy(req.environ['context']),
+                   'dalek.batch': True}
+        sub_req = wsgi.Request.blank(sub['path'],
+                                     base_url=req.application_url,
+                                     environ=environ)
+        sub_req.method = sub['method']
+        for header in _INHERITED_HEADERS:
+            if header in req.headers:
+                sub_req.headers[header] = req.headers[header]
+        if sub.get('body') is not None:
+            sub_req.content_type = 'application/json'
+            sub_req.body = jsoncodec.dumps(sub['body'])
+
+        try:
+            sub_resp = sub_req.get_response(self.application)
+            status, body = sub_resp.status_int, sub_resp.body
+            if body and sub_resp.content_type != 'application/json':
+                body = jsoncodec.dumps(six.text_type(body, 'utf-8',
+                                                     'replace'))
+        except Exception:
+            # A streamed body failing once its status was set.
+            LOG.exception(_LE("Batch sub-request %(method)s %(path)s "
+                              "failed"), sub)
+            status, body = 500, None
+        return '{"status": %d, "body": %s}' % (status, body or 'null')
+
+    @staticmethod
+    def _stream_responses(responses):
+        yield '{"responses": ['
+        for index, response in enumerate(responses):
+            yield ('' if index == 0 else ', ') + response
+        yield ']}'
+
+
+def create_resource(application):
+    return wsgi.Resource(BatchController(application))
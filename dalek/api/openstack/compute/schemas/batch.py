@@ -0,0 +1,24 @@
+"""JSON schema of the batch request body."""
+
+batch = {
+    'type': 'object',
+    'properties': {
+        'requests': {
+            'type': 'array',
+            'minItems': 1,
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'method': {'enum': ['GET', 'POST', 'PUT', 'DELETE']},
+                    'path': {'type': 'string', 'pattern': '^/',
+                             'maxLength': 2048},
+                    'body': {},
+                },
+                'required': ['method', 'path'],
+                'additionalProperties': False,
+            },
+        },
+    },
+    'required': ['requests'],
+    'additionalProperties': False,
+}
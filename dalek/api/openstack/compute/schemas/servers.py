@@ -0,0 +1,100 @@
+"""JSON schemas of the server request bodies.
+
+They only reject what upstream would refuse anyway, so that such
+requests are answered without an upstream round-trip; attributes not
+listed here are passed on to upstream unchecked.
+"""
+
+_COUNT = {
+    'type': ['integer', 'string'],
+    'pattern': '^[0-9]+$',
+    'minimum': 1,
+}
+
+_NAME = {
+    'type': 'string',
+    'minLength': 1,
+    'maxLength': 255,
+}
+
+create = {
+    'type': 'object',
+    'properties': {
+        'server': {
+            'type': 'object',
+            'properties': {
+                'name': _NAME,
+                'imageRef': {'type': 'string', 'maxLength': 255},
+                'flavorRef': {'type': ['string', 'integer'],
+                              'minLength': 1, 'maxLength': 255},
+                'min_count': _COUNT,
+                'max_count': _COUNT,
+                'return_reservation_id': {'type': ['boolean', 'string']},
+                'metadata': {
+                    'type': 'object',
+                    'additionalProperties': {'type': 'string',
+                                             'maxLength': 255},
+                    'maxProperties': 128,
+                },
+                'key_name': _NAME,
+                'availability_zone': _NAME,
+                'user_data': {'type': 'string', 'maxLength': 65535},
+                'security_groups': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {'name': _NAME},
+                        'required': ['name'],
+                    },
+                },
+                'networks': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'uuid': {'type': 'string'},
+                            'port': {'type': ['string', 'null']},
+                            'fixed_ip': {'type': 'string'},
+                        },
+                    },
+                },
+            },
+            'required': ['name', 'imageRef', 'flavorRef'],
+        },
+    },
+    'required': ['server'],
+}
+
+reboot = {
+    'type': 'object',
+    'properties': {
+        'reboot': {
+            'type': 'object',
+            'properties': {
+                'type': {
+                    'enum': ['HARD', 'Hard', 'hard', 'SOFT', 'Soft', 'soft'],
+                },
+            },
+            'required': ['type'],
+        },
+    },
+    'required': ['reboot'],
+    'additionalProperties': False,
+}
+
+bulk_action = {
+    'type': 'object',
+    'properties': {
+        'servers': {
+            'type': 'array',
+            'items': {'type': 'string', 'maxLength': 255},
+        },
+        'action': {
+            'type': 'object',
+            'minProperties': 1,
+            'maxProperties': 1,
+        },
+    },
+    'required': ['servers', 'action'],
+    'additionalProperties': False,
+}
@@ -1,16 +1,486 @@
+import base64
+import collections
+import itertools
+import time
+
+import eventlet
+from eventlet import queue
+from eventlet import semaphore
+from oslo.config import cfg
+from oslo.utils import strutils
+import six
+import webob
+from webob import exc
+
+from dalek.api.openstack import common
+from dalek.api.openstack.compute.schemas import servers as schemas
 from dalek.api.openstack import wsgi
 from dalek import compute
+from dalek.compute import poller
+from dalek import exception
+from dalek.i18n import _
+from dalek.i18n import _LE
+from dalek import jsoncodec
+from dalek.openstack.common import log as logging
+from dalek import utils
+
+bulk_action_opts = [
+    cfg.IntOpt('bulk_action_max_servers',
+               default=1000,
+               help='Maximum number of servers a bulk server action may '
+                    'target'),
+    cfg.IntOpt('bulk_action_concurrency',
+               default=50,
+               help='Maximum number of upstream server actions a worker '
+                    'runs concurrently for bulk server actions'),
+    cfg.IntOpt('bulk_action_tenant_concurrency',
+               default=10,
+               help='Maximum number of upstream server actions a worker '
+                    'runs concurrently for the bulk actions of one '
+                    'project'),
+    cfg.IntOpt('bulk_action_result_timeout',
+               default=120,
+               help='Number of seconds a bulk server action waits for the '
+                    'next server result before reporting the servers left '
+                    'as timed out'),
+]
+
+server_fragment_opts = [
+    cfg.IntOpt('server_fragment_cache_size',
+               default=10000,
+               help='Number of serialized servers a worker keeps to splice '
+                    'into server lists without encoding them again; 0 '
+                    'disables the cache'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(bulk_action_opts)
+CONF.register_opts(server_fragment_opts)
+CONF.import_opt('status_watch_timeout', 'dalek.compute.poller')
+CONF.import_opt('osapi_max_limit', 'dalek.api.openstack.common')
+CONF.import_opt('multi_create_max_count', 'dalek.compute.nova')
+
+LOG = logging.getLogger(__name__)
+
+_BULK_POOL = None
+# NOTE: bounded so that every project ever seen does not keep a
+# semaphore; a project evicted while its bulk actions run gets a fresh
+# one, which at worst lets it run twice its share for a while.
+_BULK_TENANT_SLOTS = utils.LRUCache(1000)
+
+
+def _get_bulk_pool():
+    global _BULK_POOL
+    if _BULK_POOL is None:
+        _BULK_POOL = eventlet.GreenPool(CONF.bulk_action_concurrency)
+    return _BULK_POOL
+
+
+def _get_tenant_slots(project_id):
+    slots = _BULK_TENANT_SLOTS.get(project_id)
+    if slots is None:
+        slots = semaphore.Semaphore(CONF.bulk_action_tenant_concurrency)
+        _BULK_TENANT_SLOTS.put(project_id, slots)
+    return slots
+
+
+_SERVER_FRAGMENTS = None
+
+
+def _get_server_fragments():
+    global _SERVER_FRAGMENTS
+    if _SERVER_FRAGMENTS is None:
+        _SERVER_FRAGMENTS = jsoncodec.FragmentCache(
+            CONF.server_fragment_cache_size)
+    return _SERVER_FRAGMENTS
 
 
 class Controller(wsgi.Controller):
+    _view_builder_class = common.ViewBuilder
+
     def __init__(self, **kwargs):
         self.compute_api = compute.API()
+        self._poller = poller.StatusPoller(self.compute_api.get_many,
+                                           self.compute_api.get,
+                                           self._server_status)
         super(Controller, self).__init__(**kwargs)
 
+    def index(self, req):
+        """Returns a list of server names and ids for a given user."""
+        return self._get_servers(req, is_detail=False)
+
+    def detail(self, req):
+        """Returns a list of server details for a given user."""
+        return self._get_servers(req, is_detail=True)
+
+    def show(self, req, id):
+        """Returns server details by server id."""
+        context = req.environ['context']
+        server = common.get_instance(self.compute_api, context, id)
+        return {'server': server}
+
+    @staticmethod
+    def _server_status(server):
+        vm_state = server.get('OS-EXT-STS:vm_state')
+        if vm_state is None:
+            # Without the extended status attributes only the status
+            # computed upstream is available.
+            return server.get('status')
+        return common.status_from_state(
+            vm_state, server.get('OS-EXT-STS:task_state'))
+
+    def watch(self, req, id):
+        """Wait for a server to change status.
+
+        Returns the server as soon as its status differs from the
+        ``status`` query parameter, or after ``timeout`` seconds.  When
+        the client accepts text/event-stream, every status change is sent
+        as a Server-Sent Event until the timeout expires instead.
+        """
+        context = req.environ['context']
+        timeout = utils.validate_integer(
+            req.GET.get('timeout', CONF.status_watch_timeout), 'timeout',
+            min_value=0, max_value=CONF.status_watch_timeout)
+
+        if (req.accept.best_match(['application/json',
+                                   'text/event-stream']) ==
+                'text/event-stream'):
+            server = common.get_instance(self.compute_api, context, id)
+            response = webob.Response(content_type='text/event-stream')
+            response.app_iter = self._stream_status(context, server,
+                                                    time.time() + timeout)
+            return response
+
+        try:
+            server = self._poller.watch(context, id, req.GET.get('status'),
+                                        timeout)
+        except exception.InstanceNotFound as e:
+            raise exc.HTTPNotFound(explanation=e.format_message())
+        return {'server': server}
+
+    def _stream_status(self, context, server, deadline):
+        status = self._server_status(server)
+        yield 'event: status\ndata: %s\n\n' % jsoncodec.dumps(
+            {'server': server})
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            try:
+                server = self._poller.watch(context, server['id'], status,
+                                            remaining)
+            except exception.InstanceNotFound:
+                yield 'event: deleted\ndata: %s\n\n' % jsoncodec.dumps(
+                    {'server': {'id': server['id']}})
+                return
+            if self._server_status(server) != status:
+                status = self._server_status(server)
+                yield 'event: status\ndata: %s\n\n' % jsoncodec.dumps(
+                    {'server': server})
+
+    def _get_servers(self, req, is_detail):
+        """Stream the servers list as upstream pages arrive.
+
+        The first page is fetched before responding so that upstream
+        errors still turn into proper faults; the rest is written out by
+        the streaming of ResponseObject as a chunked JSON document while
+        the next page is prefetched.
+
+        Without a limit every matching server is listed.  A limit is
+        bounded by osapi_max_limit, and a list cut short by it ends with
+        a next link in servers_links.
+        """
+        context = req.environ['context']
+        search_opts = {}
+        for key, value in req.GET.items():
+            if key not in ('limit', 'marker', 'page_size', 'sort_key',
+                           'sort_dir'):
+                search_opts[key] = value
+        sort_keys, sort_dirs = common.get_sort_params(req.params)
+
+        params = common.get_pagination_params(req)
+        # NOTE: a limit of 0 means no limit, as it does upstream.
+        limit = params.get('limit') or None
+        if limit is not None:
+            limit = min(limit, CONF.osapi_max_limit)
+        marker = params.get('marker')
+
+        pages = self.compute_api.get_all_pages(context,
+                                               detailed=is_detail,
+                                               search_opts=search_opts,
+                                               limit=limit,
+                                               marker=marker,
+                                               sort_keys=sort_keys,
+                                               sort_dirs=sort_dirs)
+        try:
+            first_page = next(pages, [])
+        except exception.MarkerNotFound as e:
+            raise exc.HTTPBadRequest(explanation=e.format_message())
+
+        fragments = _get_server_fragments()
+        version = req.api_version_request
+
+        def _encode(server):
+            # NOTE: servers are encoded once per modification and
+            # microversion, the fragments of unchanged servers are spliced
+            # in as they are.
+            return fragments.dumps((server['id'], server.get('updated'),
+                                    version), server)
+
+        if limit is None:
+            return {'servers': jsoncodec.StreamedList(
+                itertools.chain([first_page], pages), _encode)}
+
+        # NOTE: a limited list is held whole, it is at most
+        # osapi_max_limit servers, to tell whether it needs a next link.
+        servers = list(itertools.chain.from_iterable(
+            itertools.chain([first_page], pages)))
+        body = {'servers': jsoncodec.StreamedList([servers], _encode)}
+        links = self._view_builder._get_collection_links(
+            req, servers, 'servers/detail' if is_detail else 'servers', 'id')
+        if links:
+            body['servers_links'] = links
+        return body
+
+    @staticmethod
+    def _get_counts(server_dict):
+        """Return the validated (min_count, max_count) of a create body."""
+        min_count = utils.validate_integer(server_dict.get('min_count', 1),
+                                           'min_count', min_value=1)
+        max_count = utils.validate_integer(
+            server_dict.get('max_count', min_count), 'max_count',
+            min_value=1, max_value=CONF.multi_create_max_count)
+        if min_count > max_count:
+            msg = _('min_count must be <= max_count')
+            raise exc.HTTPBadRequest(explanation=msg)
+        return min_count, max_count
+
+    @staticmethod
+    def _get_create_kwargs(server_dict):
+        """Translate a create body into upstream client arguments."""
+        create_kwargs = {}
+        if 'metadata' in server_dict:
+            create_kwargs['meta'] = server_dict['metadata']
+        for key in ('key_name', 'availability_zone', 'config_drive'):
+            if key in server_dict:
+                create_kwargs[key] = server_dict[key]
+        if 'security_groups' in server_dict:
+            create_kwargs['security_groups'] = [
+                group.get('name') for group in server_dict['security_groups']]
+        if 'networks' in server_dict:
+            create_kwargs['nics'] = [
+                {'net-id': network.get('uuid'),
+                 'v4-fixed-ip': network.get('fixed_ip'),
+                 'port-id': network.get('port')}
+                for network in server_dict['networks']]
+        if server_dict.get('user_data'):
+            # NOTE: the upstream client base64 encodes user data itself.
+            try:
+                create_kwargs['userdata'] = base64.b64decode(
+                    server_dict['user_data'])
+            except TypeError:
+                msg = _("Userdata content cannot be decoded")
+                raise exc.HTTPBadRequest(explanation=msg)
+        return create_kwargs
+
     @wsgi.response(202)
+    @wsgi.schema(schemas.create)
     def create(self, req, body):
         context = req.environ['context']
-        return self.compute_api.create(context)
+        server_dict = body['server']
+        name = server_dict['name']
+        image = server_dict['imageRef']
+        flavor = server_dict['flavorRef']
+
+        min_count, max_count = self._get_counts(server_dict)
+        create_kwargs = self._get_create_kwargs(server_dict)
+
+        try:
+            return_reservation_id = strutils.bool_from_string(
+                server_dict.get('return_reservation_id', False), strict=True)
+        except ValueError as e:
+            raise exc.HTTPBadRequest(explanation=six.text_type(e))
+
+        if max_count == 1 and not return_reservation_id:
+            server = self.compute_api.create(context, name, image, flavor,
+                                             **create_kwargs)
+            return {'server': server}
+
+        reservation = self.compute_api.create_multiple(
+            context, name, image, flavor, min_count, max_count,
+            **create_kwargs)
+        return {'reservation_id': reservation['reservation_id']}
+
+    @wsgi.response(204)
+    def delete(self, req, id):
+        """Destroys a server."""
+        context = req.environ['context']
+        try:
+            self.compute_api.delete(context, id)
+        except exception.InstanceNotFound as e:
+            raise exc.HTTPNotFound(explanation=e.format_message())
+        except exception.InstanceInvalidState as state_error:
+            common.raise_http_conflict_for_instance_invalid_state(
+                state_error, 'delete', id)
+
+    def _server_action(self, req, id, action, func, *args):
+        context = req.environ['context']
+        try:
+            func(context, id, *args)
+        except exception.InstanceNotFound as e:
+            raise exc.HTTPNotFound(explanation=e.format_message())
+        except exception.InstanceInvalidState as state_error:
+            common.raise_http_conflict_for_instance_invalid_state(
+                state_error, action, id)
+
+    @wsgi.response(202)
+    @wsgi.action('reboot')
+    @wsgi.schema(schemas.reboot)
+    def _action_reboot(self, req, id, body):
+        reboot_type = body['reboot']['type'].upper()
+        self._server_action(req, id, 'reboot', self.compute_api.reboot,
+                            reboot_type)
+
+    @wsgi.response(202)
+    @wsgi.action('os-start')
+    def _start_server(self, req, id, body):
+        """Start an instance."""
+        self._server_action(req, id, 'start', self.compute_api.start)
+
+    @wsgi.response(202)
+    @wsgi.action('os-stop')
+    def _stop_server(self, req, id, body):
+        """Stop an instance."""
+        self._server_action(req, id, 'stop', self.compute_api.stop)
+
+    @wsgi.schema(schemas.bulk_action)
+    def bulk_action(self, req, body):
+        """Run one server action on many servers.
+
+        The body names the servers and carries the action exactly as it
+        would be posted to a single server, or ``{"delete": null}``::
+
+            {"servers": ["<id>", ...], "action": {"reboot": {"type": "SOFT"}}}
+
+        The per-server results are streamed back as they complete.
+        Actions run on a pool of green threads shared by the worker, and
+        at most bulk_action_tenant_concurrency at a time per project.
+        """
+        server_ids = body['servers']
+        if len(server_ids) > CONF.bulk_action_max_servers:
+            msg = _("A bulk action may target at most %d servers") % (
+                CONF.bulk_action_max_servers)
+            raise exc.HTTPBadRequest(explanation=msg)
+
+        action_body = body['action']
+        action_name = list(action_body)[0]
+        if action_name == 'delete':
+            method, args = self.delete, ()
+        elif action_name in self.wsgi_actions:
+            method = getattr(self, self.wsgi_actions[action_name])
+            args = (action_body,)
+        else:
+            msg = _("Unknown server action %s") % action_name
+            raise exc.HTTPBadRequest(explanation=msg)
+
+        # The action methods are called directly, validate their body here.
+        validator = getattr(method, 'wsgi_validator', None)
+        if validator is not None:
+            try:
+                validator(action_body)
+            except exception.ValidationError as e:
+                raise exc.HTTPBadRequest(explanation=e.format_message())
+
+        results = queue.LightQueue()
+        utils.spawn_n(self._dispatch_bulk_action, req, server_ids, method,
+                      args, results)
+
+        response = webob.Response(content_type='application/json')
+        response.app_iter = self._stream_results(results, server_ids)
+        return response
+
+    @staticmethod
+    def _dispatch_bulk_action(req, server_ids, method, args, results):
+        """Run method on every server, putting one result per server."""
+        pool = _get_bulk_pool()
+        slots = _get_tenant_slots(req.environ['context'].project_id)
+
+        def _run(server_id):
+            # Put even if the green thread is killed midway.
+            result = {'id': server_id, 'code': 500,
+                      'message': _("The action was interrupted")}
+            try:
+                method(req, server_id, *args)
+            except exc.HTTPException as e:
+                result = {'id': server_id, 'code': e.code,
+                          'message': e.explanation}
+            except Exception as e:
+                LOG.exception(_LE("Bulk action on server %s failed"),
+                              server_id)
+                result = {'id': server_id, 'code': 500,
+                          'message': six.text_type(e)}
+            else:
+                result = {'id': server_id,
+                          'code': getattr(method, 'wsgi_code', 202)}
+            finally:
+                slots.release()
+                results.put(result)
+
+        dispatched = 0
+        try:
+            for server_id in server_ids:
+                # Wait for the project's own slot before taking a pool
+                # slot, so one project cannot starve the others.
+                slots.acquire()
+                try:
+                    pool.spawn_n(_run, server_id)
+                except BaseException:
+                    slots.release()
+                    raise
+                dispatched += 1
+        finally:
+            for server_id in server_ids[dispatched:]:
+                results.put({'id': server_id, 'code': 500,
+                             'message': _("The action was not run")})
+
+    @staticmethod
+    def _stream_results(results, server_ids):
+        pending = collections.Counter(server_ids)
+        separator = ''
+        yield '{"results": ['
+        for _index in range(len(server_ids)):
+            try:
+                result = results.get(
+                    timeout=CONF.bulk_action_result_timeout)
+            except queue.Empty:
+                # Report the servers left rather than hang the response.
+                message = _("No result within %d seconds") % (
+                    CONF.bulk_action_result_timeout)
+                for server_id in pending.elements():
+                    yield separator + jsoncodec.dumps(
+                        {'id': server_id, 'code': 504, 'message': message})
+                    separator = ', '
+                break
+            pending[result['id']] -= 1
+            yield separator + jsoncodec.dumps(result)
+            separator = ', '
+        yield ']}'
+
+    def show_reservation(self, req, id):
+        """Return the progress of a multi-create reservation.
+
+        Without memcached_servers, reservations are only known to the API
+        worker which created them and the others answer 404.
+        """
+        context = req.environ['context']
+        try:
+            reservation = self.compute_api.get_reservation(context, id)
+        except exception.ReservationNotFound as e:
+            raise exc.HTTPNotFound(explanation=e.format_message())
+
+        reservation = dict(reservation)
+        reservation.pop('project_id', None)
+        return {'reservation': reservation}
 
 
 def create_resource():
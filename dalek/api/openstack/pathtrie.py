@@ -0,0 +1,283 @@
+"""Segment trie matching requests against the routes of a routes.Mapper.
+
+routes.Mapper tries the regular expression of its routes one after the
+other on every request, so the cost of routing grows with each route an
+extension adds.  The routes of a mapper are compiled here into a trie
+of path segments instead: literal segments are looked up in a dict,
+and parameters such as ``{project_id}``, ``{id}`` or ``.{format}`` are
+typed slots checked against their requirement, if any.  A request then
+costs a few dict lookups per path segment whatever the number of
+routes.
+
+When several routes match, the one connected first wins, as with the
+mapper.  Routes the trie cannot express, such as wildcards or
+conditions other than the request method, make TrieRouter.compile()
+return None so that the mapper keeps routing on its own.  Routes
+connected to the mapper after the trie is compiled are picked up by
+compiling it again on the next request, or by handing routing back to
+the mapper if they cannot be expressed.
+"""
+
+import re
+
+import routes.middleware
+import six
+
+from dalek.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+_PARAM_RE = re.compile(r'\{(\w+)(?::([^{}]+))?\}|:\((\w+)\)|:(\w+)')
+_CHOICE_RE = re.compile(r'^[\w-]+(\|[\w-]+)*$')
+
+
+class NotCompilable(Exception):
+    pass
+
+
+def _value_check(requirement):
+    """Return a function telling whether a parameter value is valid."""
+    if requirement is None:
+        return None
+    if _CHOICE_RE.match(requirement):
+        choices = frozenset(requirement.split('|'))
+        return choices.__contains__
+    pattern = re.compile(r'(?:%s)\Z' % requirement)
+    return lambda value: pattern.match(value) is not None
+
+
+def _parse_segment(template, reqs):
+    """Split a segment template into literal strings and parameters.
+
+    Parameters are returned as (name, requirement) tuples.
+    """
+    if '*' in template:
+        raise NotCompilable(template)
+    parts = []
+    pos = 0
+    for match in _PARAM_RE.finditer(template):
+        if match.start() > pos:
+            parts.append(template[pos:match.start()])
+        name = match.group(1) or match.group(3) or match.group(4)
+        parts.append((name, match.group(2) or reqs.get(name)))
+        pos = match.end()
+    if pos < len(template):
+        parts.append(template[pos:])
+    if any(isinstance(part, six.string_types) and
+           ('{' in part or '}' in part or ':' in part)
+           for part in parts):
+        raise NotCompilable(template)
+    return parts
+
+
+class _Node(object):
+    """Routes reachable through the same path segments."""
+
+    __slots__ = ('literals', 'dotted', 'slots', 'routes', 'min_index')
+
+    def __init__(self):
+        # segment: node
+        self.literals = {}
+        # literal before the last dot: {(name, check): node}
+        self.dotted = {}
+        # ((name, check), ...) of a whole segment or split at its last
+        # dot: node
+        self.slots = {}
+        # (index, methods, defaults) of the routes ending here
+        self.routes = []
+        self.min_index = None
+
+    def child(self, container, key):
+        node = container.get(key)
+        if node is None:
+            node = container[key] = _Node()
+        return node
+
+
+class TrieRouter(object):
+    """WSGI app routing requests like routes.middleware.RoutesMiddleware.
+
+    The match of a request is stored in ``wsgiorg.routing_args`` before
+    the request is handed to application.
+    """
+
+    def __init__(self, application, mapper, root):
+        self.application = application
+        self._mapper = mapper
+        self._root = root
+        # Number of routes of the mapper compiled into the trie.
+        self._compiled = len(mapper.matchlist)
+        # RoutesMiddleware used once routes cannot be compiled any more.
+        self._fallback = None
+
+    @classmethod
+    def compile(cls, mapper, application):
+        """Return a TrieRouter for the routes of mapper, or None."""
+        root = cls._build(mapper)
+        if root is None:
+            return None
+        return cls(application, mapper, root)
+
+    @classmethod
+    def _build(cls, mapper):
+        """Return the root of a trie of the routes of mapper, or None."""
+        root = _Node()
+        # Checks are shared by the parameters with the same requirement.
+        checks = {}
+        try:
+            for index, route in enumerate(mapper.matchlist):
+                cls._add(root, index, route, checks)
+        except NotCompilable as e:
+            LOG.debug("Routing with the mapper, cannot compile route "
+                      "segment %s", e)
+            return None
+        return root
+
+    def _refresh(self):
+        """Compile again the routes of the mapper if some were added."""
+        count = len(self._mapper.matchlist)
+        if count == self._compiled:
+            return
+        LOG.debug("Compiling %(count)d routes again, %(added)d were "
+                  "connected since", {'count': count,
+                                      'added': count - self._compiled})
+        self._root = self._build(self._mapper)
+        self._compiled = count
+        if self._root is None:
+            self._fallback = routes.middleware.RoutesMiddleware(
+                self.application, self._mapper)
+
+    @staticmethod
+    def _add(root, index, route, checks):
+        conditions = dict(route.conditions or {})
+        methods = conditions.pop('method', None)
+        if conditions:
+            raise NotCompilable(route.routepath)
+
+        def check(requirement):
+            if requirement not in checks:
+                checks[requirement] = _value_check(requirement)
+            return checks[requirement]
+
+        node = root
+        path = [node]
+        for template in route.routepath.split('/'):
+            if not template:
+                continue
+            parts = _parse_segment(template, route.reqs)
+            if len(parts) == 1 and isinstance(parts[0], six.string_types):
+                node = node.child(node.literals, parts[0])
+            elif len(parts) == 1:
+                name, requirement = parts[0]
+                node = node.child(node.slots,
+                                  ((name, check(requirement)),))
+            elif (len(parts) == 2 and
+                    isinstance(parts[0], six.string_types) and
+                    parts[0].endswith('.') and len(parts[0]) > 1):
+                name, requirement = parts[1]
+                extensions = node.dotted.setdefault(parts[0][:-1], {})
+                node = node.child(extensions, (name, check(requirement)))
+            elif (len(parts) == 3 and not isinstance(parts[0],
+                                                     six.string_types) and
+                    parts[1] == '.'):
+                (name, requirement), _dot, (ext, ext_requirement) = parts
+                key = ((name, check(requirement)),
+                       (ext, check(ext_requirement)))
+                node = node.child(node.slots, key)
+            else:
+                raise NotCompilable(template)
+            path.append(node)
+
+        node.routes.append((index, frozenset(methods) if methods else None,
+                            dict(route.defaults)))
+        for parent in path:
+            if parent.min_index is None:
+                parent.min_index = index
+
+    def match(self, path_info, method):
+        """Return the routing args of a request, or None."""
+        self._refresh()
+        if self._root is None:
+            result = self._mapper.routematch(environ={
+                'PATH_INFO': path_info, 'REQUEST_METHOD': method})
+            return result[0] if result else None
+        return self._match(path_info, method)
+
+    def _match(self, path_info, method):
+        if not path_info.startswith('/'):
+            return None
+        if path_info == '/':
+            # NOTE: "/" ends at the root, as a route connected at "/".
+            segments = []
+        else:
+            segments = path_info.split('/')[1:]
+        found = self._search(self._root, segments, 0, method, [], None)
+        if found is None:
+            return None
+        _index, defaults, bindings = found
+        match = dict(defaults)
+        for name, value in bindings:
+            if isinstance(value, six.binary_type):
+                value = value.decode('utf-8', 'replace')
+            match[name] = value
+        return match
+
+    def _search(self, node, segments, pos, method, bindings, best):
+        """Return the first route matching the segments from pos on.
+
+        :param best: (index, defaults, bindings) of the first route found
+                     so far, only routes connected before it are searched
+        """
+        if best is not None and node.min_index >= best[0]:
+            return best
+        if pos == len(segments):
+            for index, methods, defaults in node.routes:
+                if best is not None and index >= best[0]:
+                    break
+                if methods is None or method in methods:
+                    return index, defaults, list(bindings)
+            return best
+
+        segment = segments[pos]
+        if not segment:
+            return best
+        child = node.literals.get(segment)
+        if child is not None:
+            best = self._search(child, segments, pos + 1, method, bindings,
+                                best)
+
+        head, dot, tail = segment.rpartition('.')
+        extensions = node.dotted.get(head) if dot and tail else None
+        if extensions:
+            for (name, check), child in extensions.items():
+                if check is None or check(tail):
+                    bindings.append((name, tail))
+                    best = self._search(child, segments, pos + 1, method,
+                                        bindings, best)
+                    bindings.pop()
+
+        for key, child in node.slots.items():
+            if len(key) == 1:
+                values = (segment,)
+            elif dot and head and tail:
+                values = (head, tail)
+            else:
+                continue
+            if not all(check is None or check(value)
+                       for (_name, check), value in zip(key, values)):
+                continue
+            bindings.extend((name, value)
+                            for (name, _check), value in zip(key, values))
+            best = self._search(child, segments, pos + 1, method, bindings,
+                                best)
+            del bindings[-len(values):]
+        return best
+
+    def __call__(self, environ, start_response):
+        self._refresh()
+        if self._fallback is not None:
+            return self._fallback(environ, start_response)
+        match = self._match(environ.get('PATH_INFO', ''),
+                            environ.get('REQUEST_METHOD'))
+        environ['wsgiorg.routing_args'] = ((), match or {})
+        return self.application(environ, start_response)
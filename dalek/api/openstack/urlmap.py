@@ -20,10 +20,14 @@ import paste.urlmap
 
 from dalek.api.openstack import wsgi
 from dalek.openstack.common import log as logging
+from dalek import utils
 
 
 LOG = logging.getLogger(__name__)
 
+_CONTENT_TYPE_OPTIONS = utils.LRUCache(wsgi.HEADER_CACHE_SIZE)
+_ACCEPT_MATCHES = utils.LRUCache(wsgi.HEADER_CACHE_SIZE)
+
 
 _quoted_string_re = r'"[^"\\]*(?:\\.[^"\\]*)*"'
 _option_header_piece_re = re.compile(r';\s*([^\s;=]+|%s)\s*'
@@ -158,13 +162,41 @@ def urlmap_factory(loader, global_conf, **local_conf):
 
 
 class URLMap(paste.urlmap.URLMap):
+    def __init__(self, *args, **kwargs):
+        self._prefixes = None
+        self._max_depth = 0
+        super(URLMap, self).__init__(*args, **kwargs)
+
+    def __setitem__(self, url, app):
+        self._prefixes = None
+        super(URLMap, self).__setitem__(url, app)
+
+    def __delitem__(self, url):
+        self._prefixes = None
+        super(URLMap, self).__delitem__(url)
+
+    def _compile_prefixes(self):
+        """Index the applications by mount point, in matching order."""
+        prefixes = {}
+        for (domain, app_url), app in self.applications:
+            prefixes.setdefault(app_url, []).append((domain, app))
+        self._max_depth = max([app_url.count('/') for app_url in prefixes]
+                              or [0])
+        self._prefixes = prefixes
+
     def _match(self, host, port, path_info):
         """Find longest match for a given URL path."""
-        for (domain, app_url), app in self.applications:
-            if domain and domain != host and domain != host + ':' + port:
-                continue
-            if (path_info == app_url
-                    or path_info.startswith(app_url + '/')):
+        if self._prefixes is None:
+            self._compile_prefixes()
+
+        # Mount points are looked up from the longest prefix of path_info
+        # ending at a '/' down to the empty one.
+        parts = path_info.split('/', self._max_depth + 1)
+        for depth in range(min(self._max_depth, len(parts) - 1), -1, -1):
+            app_url = '/'.join(parts[:depth + 1])
+            for domain, app in self._prefixes.get(app_url, ()):
+                if domain and domain != host and domain != host + ':' + port:
+                    continue
                 return app, app_url
 
         return None, None
@@ -207,7 +239,10 @@ class URLMap(paste.urlmap.URLMap):
     def _content_type_strategy(self, host, port, environ):
         """Check Content-Type header for API version."""
         app = None
-        params = parse_options_header(environ.get('CONTENT_TYPE', ''))[1]
+        content_type = environ.get('CONTENT_TYPE', '')
+        params = wsgi.parse_header_cached(
+            _CONTENT_TYPE_OPTIONS, content_type,
+            lambda: parse_options_header(content_type))[1]
         if 'version' in params:
             app, app_url = self._match(host, port, '/v' + params['version'])
             if app:
@@ -217,12 +252,14 @@ class URLMap(paste.urlmap.URLMap):
 
     def _accept_strategy(self, host, port, environ, supported_content_types):
         """Check Accept header for best matching MIME type and API version."""
-        accept = Accept(environ.get('HTTP_ACCEPT', ''))
+        accept = environ.get('HTTP_ACCEPT', '')
 
         app = None
 
         # Find the best match in the Accept header
-        mime_type, params = accept.best_match(supported_content_types)
+        mime_type, params = wsgi.parse_header_cached(
+            _ACCEPT_MATCHES, (accept, tuple(supported_content_types)),
+            lambda: Accept(accept).best_match(supported_content_types))
         if 'version' in params:
             app, app_url = self._match(host, port, '/v' + params['version'])
             if app:
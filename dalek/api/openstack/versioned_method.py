@@ -12,6 +12,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import bisect
+import sys
+
+from dalek import exception
+
+# Bounds standing in for the open ends of a version range
+_OLDEST = (0, 0)
+_LATEST = (sys.maxint, sys.maxint)
+
 
 class VersionedMethod(object):
 
@@ -33,3 +42,45 @@ class VersionedMethod(object):
     def __str__(self):
         return ("Version Method %s: min: %s, max: %s"
                 % (self.name, self.start_version, self.end_version))
+
+
+def _bound(version, default):
+    if version.is_null():
+        return default
+    return (version.ver_major, version.ver_minor)
+
+
+class VersionIndex(object):
+    """The versions of one method, indexed by their version ranges.
+
+    Ranges are kept sorted by minimum version so the version matching a
+    request is found by bisection instead of a scan.
+    """
+
+    def __init__(self, name, methods):
+        ranges = sorted(
+            ((_bound(method.start_version, _OLDEST),
+              _bound(method.end_version, _LATEST),
+              method) for method in methods),
+            key=lambda version_range: version_range[0])
+
+        for previous, current in zip(ranges, ranges[1:]):
+            if current[0] <= previous[1]:
+                start, end, _method = current
+                raise exception.ApiVersionsIntersect(
+                    name=name, min_ver='%s.%s' % start,
+                    max_ver='latest' if end == _LATEST else '%s.%s' % end)
+
+        self._starts = [version_range[0] for version_range in ranges]
+        self._ends = [version_range[1] for version_range in ranges]
+        self._methods = [version_range[2] for version_range in ranges]
+
+    def lookup(self, ver):
+        """Return the VersionedMethod matching ver, or None."""
+        if ver.is_null():
+            return None
+        version = (ver.ver_major, ver.ver_minor)
+        index = bisect.bisect_right(self._starts, version) - 1
+        if index >= 0 and version <= self._ends[index]:
+            return self._methods[index]
+        return None
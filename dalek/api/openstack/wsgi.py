@@ -14,28 +14,44 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import functools
 import inspect
 import math
 import time
 
-from oslo.serialization import jsonutils
+from oslo.config import cfg
 from oslo.utils import strutils
 import six
 import webob
 
 from dalek.api.openstack import api_version_request as api_version
 from dalek.api.openstack import versioned_method
+from dalek.api import validation
 from dalek import exception
 from dalek import i18n
 from dalek.i18n import _
 from dalek.i18n import _LE
 from dalek.i18n import _LI
+from dalek import jsoncodec
+from dalek import offload
 from dalek.openstack.common import log as logging
 from dalek import utils
 from dalek import wsgi
 
 
+wsgi_opts = [
+    cfg.IntOpt('stream_response_min_items',
+               default=100,
+               help='Minimum number of items a list of a response body '
+                    'must hold for the body to be streamed while it is '
+                    'serialized, without a Content-Length; 0 disables '
+                    'streaming, except for the lists controllers produce '
+                    'page by page, which are always streamed'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(wsgi_opts)
+CONF.import_opt('offload_serialize_min_items', 'dalek.offload')
+
 LOG = logging.getLogger(__name__)
 
 _SUPPORTED_CONTENT_TYPES = (
@@ -68,6 +84,9 @@ DEFAULT_API_VERSION = "2.1"
 # name of attribute to keep version method information
 VER_METHOD_ATTR = 'versioned_methods'
 
+# name of attribute to keep the version index of each versioned method
+VER_INDEX_ATTR = 'versioned_method_index'
+
 # Name of header used by clients to request a specific version
 # of the REST API
 API_VERSION_REQUEST_HEADER = 'X-Adaptor-API-Version'
@@ -81,10 +100,47 @@ def get_media_map():
     return dict(_MEDIA_TYPE_MAP.items())
 
 
+# Parsed request headers are cached by raw value, since clients send the
+# same few values over and over.  Bounded in number of entries and in
+# size, as any value may be sent.
+HEADER_CACHE_SIZE = 256
+_MAX_CACHED_HEADER_LENGTH = 256
+
+_ACCEPT_MATCHES = utils.LRUCache(HEADER_CACHE_SIZE)
+_LANGUAGE_MATCHES = utils.LRUCache(HEADER_CACHE_SIZE)
+
+_MISSING = object()
+
+
+def parse_header_cached(cache, key, parse):
+    """Return the result of parse(), cached in cache by key.
+
+    key is the raw header value, or a tuple starting with it; the result
+    is shared between requests and must not be modified.
+    """
+    header = key[0] if isinstance(key, tuple) else key
+    if len(header) > _MAX_CACHED_HEADER_LENGTH:
+        return parse()
+    result = cache.get(key, _MISSING)
+    if result is _MISSING:
+        result = parse()
+        cache.put(key, result)
+    return result
+
+
+def _from_json(datastring):
+    try:
+        return jsoncodec.loads(datastring)
+    except ValueError:
+        msg = _("cannot understand JSON")
+        raise exception.MalformedRequestBody(reason=msg)
+
+
 class Request(webob.Request):
     def __init__(self, *args, **kwargs):
         super(Request, self).__init__(*args, **kwargs)
         self._extension_data = {'db_items': {}}
+        self._decoded_body = None
         if not hasattr(self, 'api_version_request'):
             self.api_version_request = api_version.APIVersionRequest()
 
@@ -166,8 +222,10 @@ class Request(webob.Request):
                     content_type = possible_type
 
             if not content_type:
-                content_type = self.accept.best_match(
-                    get_supported_content_types())
+                content_type = parse_header_cached(
+                    _ACCEPT_MATCHES, self.environ.get('HTTP_ACCEPT', ''),
+                    lambda: self.accept.best_match(
+                        get_supported_content_types()))
 
             self.environ['nova.best_content_type'] = (content_type or
                                                       'application/json')
@@ -196,16 +254,39 @@ class Request(webob.Request):
 
         return content_type
 
+    def get_json_body(self, body=None):
+        """Return the JSON-decoded request body.
+
+        The body is decoded at most once per request: the action lookup
+        and the deserializer share the result.  This is not lazy: the
+        body of a POST or PUT request is decoded by Resource before the
+        method is dispatched, whether the method reads it or not, since
+        it is validated and passed decoded as the ``body`` argument.
+        Callers pass the body string they hold to avoid copying it out
+        of the request again.
+
+        :raises MalformedRequestBody: if the body is not valid JSON
+        """
+        if body is None:
+            body = self.body
+        decoded = self._decoded_body
+        if decoded is None or decoded[0] is not body:
+            decoded = self._decoded_body = (body, _from_json(body))
+        return decoded[1]
+
     def best_match_language(self):
         """Determine the best available language for the request.
 
         :returns: the best language match or None if the 'Accept-Language'
                   header was not available in the request.
         """
-        if not self.accept_language:
+        header = self.environ.get('HTTP_ACCEPT_LANGUAGE')
+        if not header:
             return None
-        return self.accept_language.best_match(
-            i18n.get_available_languages())
+        return parse_header_cached(
+            _LANGUAGE_MATCHES, header,
+            lambda: self.accept_language.best_match(
+                i18n.get_available_languages()))
 
     def set_api_version_request(self):
         """Set API version request based on the request header information."""
@@ -216,8 +297,7 @@ class Request(webob.Request):
             if hdr_string == 'latest':
                 self.api_version_request = api_version.max_api_version()
             else:
-                self.api_version_request = api_version.APIVersionRequest(
-                    hdr_string)
+                self.api_version_request = api_version.parse(hdr_string)
 
                 # Check that the version requested is within the global
                 # minimum/maximum of supported API versions
@@ -230,7 +310,7 @@ class Request(webob.Request):
                         max_ver=api_version.max_api_version().get_string())
 
         else:
-            self.api_version_request = api_version.APIVersionRequest(
+            self.api_version_request = api_version.parse(
                 api_version.DEFAULT_API_VERSION)
 
 
@@ -258,12 +338,16 @@ class TextDeserializer(ActionDispatcher):
 
 
 class JSONDeserializer(TextDeserializer):
+    # Resource passes the request, whose decoded body is reused.
+    want_request = True
+
+    def __init__(self, request=None):
+        self.request = request
+
     def _from_json(self, datastring):
-        try:
-            return jsonutils.loads(datastring)
-        except ValueError:
-            msg = _("cannot understand JSON")
-            raise exception.MalformedRequestBody(reason=msg)
+        if self.request is not None:
+            return self.request.get_json_body(datastring)
+        return _from_json(datastring)
 
     def default(self, datastring):
         return {'body': self._from_json(datastring)}
@@ -278,12 +362,22 @@ class DictSerializer(ActionDispatcher):
     def default(self, data):
         return ""
 
+    def serialize_iter(self, data, action='default'):
+        """Serialize data as an iterable of chunks of the body."""
+        return [self.serialize(data, action=action)]
+
 
 class JSONDictSerializer(DictSerializer):
     """Default JSON request body serialization."""
 
     def default(self, data):
-        return jsonutils.dumps(data)
+        return jsoncodec.dumps(data)
+
+    def serialize_iter(self, data, action='default'):
+        if action != 'default' and hasattr(self, action):
+            return super(JSONDictSerializer, self).serialize_iter(data,
+                                                                  action)
+        return jsoncodec.iterdumps(data)
 
 
 def serializers(**serializers):
@@ -320,6 +414,22 @@ def deserializers(**deserializers):
     return decorator
 
 
+def schema(request_body_schema):
+    """Attaches a JSON schema validating the request body to a method.
+
+    The schema is compiled once by ControllerMetaclass, and bodies not
+    matching it are rejected with a 400 before the method is called.
+    Note that the function attributes are directly manipulated; the
+    method is not wrapped.
+    """
+
+    def decorator(func):
+        func.wsgi_schema = request_body_schema
+        return func
+
+    return decorator
+
+
 def response(code):
     """Attaches response code to a method.
 
@@ -405,7 +515,7 @@ class ResponseObject(object):
         default_serializers = default_serializers or {}
 
         try:
-            mtype = get_media_map().get(content_type, content_type)
+            mtype = _MEDIA_TYPE_MAP.get(content_type, content_type)
             if mtype in self.serializers:
                 return mtype, self.serializers[mtype]
             else:
@@ -452,10 +562,66 @@ class ResponseObject(object):
             response.headers[hdr] = utils.utf8(str(value))
         response.headers['Content-Type'] = utils.utf8(content_type)
         if self.obj is not None:
-            response.body = serializer.serialize(self.obj)
+            items = self._list_items()
+            # NOTE: streamed lists are produced by green threads, which
+            # cannot run in native threads.
+            streamed = self._has_streamed_list()
+            # NOTE: only bodies holding a long list are worth streaming,
+            # small ones keep their Content-Length.
+            if streamed or 0 < CONF.stream_response_min_items <= items:
+                # The chunks are encoded by Python code, which gives up
+                # the GIL between bytecodes; a whole body encoded at once
+                # holds it in C and gains nothing from a native thread.
+                offloaded = (not streamed and offload.enabled() and
+                             items >= CONF.offload_serialize_min_items)
+                response.app_iter = self._stream(serializer, offloaded)
+            else:
+                response.body = serializer.serialize(self.obj)
 
         return response
 
+    def _list_items(self):
+        """Return the length of the longest list of the body."""
+        if not isinstance(self.obj, dict):
+            return 0
+        return max([len(value) for value in self.obj.values()
+                    if isinstance(value, (list, tuple))] or [0])
+
+    def _has_streamed_list(self):
+        return (isinstance(self.obj, dict) and
+                any(isinstance(value, jsoncodec.StreamedList)
+                    for value in self.obj.values()))
+
+    def _stream(self, serializer, offloaded):
+        chunks = serializer.serialize_iter(self.obj)
+        chunks = offload.iterate(chunks) if offloaded else iter(chunks)
+        # Serialize the first chunk now, so that an object which cannot be
+        # serialized or an upstream error while the first items are
+        # produced still fail the request, and become faults in
+        # FaultWrapper, before the response is started.
+        first = next(chunks, None)
+        if first is None:
+            return chunks
+        return self._write(first, chunks)
+
+    @staticmethod
+    def _write(first, chunks):
+        try:
+            yield first
+            for chunk in chunks:
+                yield chunk
+        except Exception:
+            # NOTE: the status is sent already, the body can only be cut
+            # short, which the client sees as a truncated chunked body.
+            LOG.exception(_LE("Response body failed after it was started"))
+            raise
+        finally:
+            # Stop producing, e.g. prefetching pages, when the client
+            # disconnects.
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
     @property
     def code(self):
         """Retrieve the response status."""
@@ -469,14 +635,17 @@ class ResponseObject(object):
         return self._headers.copy()
 
 
-def action_peek_json(body):
-    """Determine action to invoke."""
+def action_peek_json(body, request=None):
+    """Determine action to invoke.
 
-    try:
-        decoded = jsonutils.loads(body)
-    except ValueError:
-        msg = _("cannot understand JSON")
-        raise exception.MalformedRequestBody(reason=msg)
+    The body decoded here is kept on the request, if given, for the
+    deserializer.
+    """
+
+    if request is not None:
+        decoded = request.get_json_body(body)
+    else:
+        decoded = _from_json(body)
 
     # Make sure there's exactly one key...
     if len(decoded) != 1:
@@ -487,6 +656,9 @@ def action_peek_json(body):
     return decoded.keys()[0]
 
 
+action_peek_json.want_request = True
+
+
 class ResourceExceptionHandler(object):
     """Context manager to handle Resource exceptions.
 
@@ -505,6 +677,11 @@ class ResourceExceptionHandler(object):
         if isinstance(ex_value, exception.Forbidden):
             raise Fault(webob.exc.HTTPForbidden(
                 explanation=ex_value.format_message()))
+        elif isinstance(ex_value, exception.UpstreamUnavailable):
+            retry_after = '%d' % ex_value.kwargs['retry_after']
+            raise Fault(webob.exc.HTTPServiceUnavailable(
+                explanation=ex_value.format_message(),
+                headers={'Retry-After': retry_after}))
         elif isinstance(ex_value, exception.Invalid):
             raise Fault(exception.ConvertedException(
                 code=ex_value.code,
@@ -566,6 +743,12 @@ class Resource(wsgi.Application):
         self.action_peek = dict(json=action_peek_json)
         self.action_peek.update(action_peek or {})
 
+        # (action, body action key, API version) -> (method, extensions)
+        self._dispatch_table = {}
+        # Whether action routes are told apart by the key of their body,
+        # rather than served by a method of their own.
+        self._peeks_action = not hasattr(controller or self, 'action')
+
         # Copy over the actions dictionary
         self.wsgi_actions = {}
         if controller:
@@ -582,25 +765,30 @@ class Resource(wsgi.Application):
         actions = getattr(controller, 'wsgi_actions', {})
         for key, method_name in actions.items():
             self.wsgi_actions[key] = getattr(controller, method_name)
+        self._dispatch_table.clear()
 
     def register_extensions(self, controller):
-        """Registers controller extensions with this resource."""
+        """Registers controller extensions with this resource.
+
+        Extensions are kept as frozen chains of (extension, is_generator)
+        pairs, classified once here rather than on every request.
+        """
 
         extensions = getattr(controller, 'wsgi_extensions', [])
         for method_name, action_name in extensions:
             # Look up the extending method
             extension = getattr(controller, method_name)
+            step = ((extension, inspect.isgeneratorfunction(extension)),)
 
             if action_name:
                 # Extending an action...
-                if action_name not in self.wsgi_action_extensions:
-                    self.wsgi_action_extensions[action_name] = []
-                self.wsgi_action_extensions[action_name].append(extension)
+                self.wsgi_action_extensions[action_name] = (
+                    self.wsgi_action_extensions.get(action_name, ()) + step)
             else:
                 # Extending a regular method
-                if method_name not in self.wsgi_extensions:
-                    self.wsgi_extensions[method_name] = []
-                self.wsgi_extensions[method_name].append(extension)
+                self.wsgi_extensions[method_name] = (
+                    self.wsgi_extensions.get(method_name, ()) + step)
+        self._dispatch_table.clear()
 
     def get_action_args(self, request_environment):
         """Parse dictionary created by routes library."""
@@ -636,10 +824,10 @@ class Resource(wsgi.Application):
 
         return content_type, request.body
 
-    def deserialize(self, meth, content_type, body):
+    def deserialize(self, meth, content_type, body, request=None):
         meth_deserializers = getattr(meth, 'wsgi_deserializers', {})
         try:
-            mtype = get_media_map().get(content_type, content_type)
+            mtype = _MEDIA_TYPE_MAP.get(content_type, content_type)
             if mtype in meth_deserializers:
                 deserializer = meth_deserializers[mtype]
             else:
@@ -650,15 +838,17 @@ class Resource(wsgi.Application):
         if (hasattr(deserializer, 'want_controller')
             and deserializer.want_controller):
             return deserializer(self.controller).deserialize(body)
+        elif getattr(deserializer, 'want_request', False):
+            return deserializer(request=request).deserialize(body)
         else:
             return deserializer().deserialize(body)
 
     def pre_process_extensions(self, extensions, request, action_args):
-        # List of callables for post-processing extensions
+        # List of (callable, is_generator) for post-processing extensions
         post = []
 
-        for ext in extensions:
-            if inspect.isgeneratorfunction(ext):
+        for ext, is_generator in extensions:
+            if is_generator:
                 response = None
 
                 # If it's a generator function, the part before the
@@ -675,19 +865,19 @@ class Resource(wsgi.Application):
                     return response, []
 
                 # No response, queue up generator for post-processing
-                post.append(gen)
+                post.append((gen, True))
             else:
                 # Regular functions only perform post-processing
-                post.append(ext)
+                post.append((ext, False))
 
         # Run post-processing in the reverse order
         return None, reversed(post)
 
     def post_process_extensions(self, extensions, resp_obj, request,
                                 action_args):
-        for ext in extensions:
+        for ext, is_generator in extensions:
             response = None
-            if inspect.isgenerator(ext):
+            if is_generator:
                 # If it's a generator, run the second half of
                 # processing
                 try:
@@ -762,6 +952,9 @@ class Resource(wsgi.Application):
         except exception.MalformedRequestBody:
             msg = _("Malformed request body")
             return Fault(webob.exc.HTTPBadRequest(explanation=msg))
+        except exception.VersionNotFoundForAPIMethod:
+            # NOTE: as in dispatch(), look as if the method does not exist.
+            return Fault(webob.exc.HTTPNotFound())
 
         if body:
             msg = _("Action: '%(action)s', calling method: %(meth)s, body: "
@@ -781,7 +974,8 @@ class Resource(wsgi.Application):
                 if request.content_length == 0:
                     contents = {'body': None}
                 else:
-                    contents = self.deserialize(meth, content_type, body)
+                    contents = self.deserialize(meth, content_type, body,
+                                                request)
         except exception.InvalidContentType:
             msg = _("Unsupported Content-Type")
             return Fault(webob.exc.HTTPBadRequest(explanation=msg))
@@ -789,13 +983,22 @@ class Resource(wsgi.Application):
             msg = _("Malformed request body")
             return Fault(webob.exc.HTTPBadRequest(explanation=msg))
 
+        # ...and reject it early if it does not match the method's schema.
+        validator = getattr(meth, 'wsgi_validator', None)
+        if validator is not None and self._should_have_body(request):
+            try:
+                validator(contents.get('body'))
+            except exception.ValidationError as e:
+                return Fault(webob.exc.HTTPBadRequest(
+                    explanation=e.format_message()))
+
         # Update the action args
         action_args.update(contents)
 
         project_id = action_args.pop("project_id", None)
         context = request.environ.get('context')
         context.project_id = project_id
-
+        context.api_version_request = request.api_version_request
 
         # Run pre-processing extensions
         response, post = self.pre_process_extensions(extensions,
@@ -850,6 +1053,34 @@ class Resource(wsgi.Application):
         return response
 
     def get_method(self, request, action, content_type, body):
+        """Look up the method implementing action and its extensions.
+
+        Lookups are compiled once into a dispatch table keyed by action,
+        the action key of the body for ``action`` routes, and the
+        requested API version, which also selects the implementation of
+        versioned methods.
+        """
+        ver = request.api_version_request
+        version = None if ver.is_null() else (ver.ver_major, ver.ver_minor)
+        action_name = None
+        if action == 'action' and self._peeks_action:
+            action_name = self._peek_action(request, content_type, body)
+
+        key = (action, action_name, version)
+        entry = self._dispatch_table.get(key)
+        if entry is None:
+            entry = self._compile_method(request, action, content_type, body)
+            self._dispatch_table[key] = entry
+        return entry
+
+    def _peek_action(self, request, content_type, body):
+        """Return the action key of an action route's body."""
+        peek = self.action_peek[_MEDIA_TYPE_MAP.get(content_type)]
+        if getattr(peek, 'want_request', False):
+            return peek(body, request=request)
+        return peek(body)
+
+    def _compile_method(self, request, action, content_type, body):
         meth, extensions = self._get_method(request,
                                             action,
                                             content_type,
@@ -859,7 +1090,12 @@ class Resource(wsgi.Application):
                                                          action,
                                                          content_type,
                                                          body)
-            extensions.extend(parent_ext)
+            extensions += parent_ext
+
+        if (getattr(meth, 'wsgi_versioned', False) and
+                not request.api_version_request.is_null()):
+            meth = self.controller.get_versioned_method(
+                meth.__name__, request.api_version_request)
         return meth, extensions
 
     def _get_method(self, request, action, content_type, body):
@@ -877,18 +1113,17 @@ class Resource(wsgi.Application):
                 # Propagate the error
                 raise
         else:
-            return meth, self.wsgi_extensions.get(action, [])
+            return meth, self.wsgi_extensions.get(action, ())
 
         if action == 'action':
             # OK, it's an action; figure out which action...
-            mtype = get_media_map().get(content_type)
-            action_name = self.action_peek[mtype](body)
+            action_name = self._peek_action(request, content_type, body)
         else:
             action_name = action
 
         # Look up the action method
         return (self.wsgi_actions[action_name],
-                self.wsgi_action_extensions.get(action_name, []))
+                self.wsgi_action_extensions.get(action_name, ()))
 
     def dispatch(self, method, request, action_args):
         """Dispatch a call to the action-specific method."""
@@ -951,6 +1186,38 @@ def extends(*args, **kwargs):
     return decorator
 
 
+def _version_selector(key):
+    """Build the method standing in for the versions of method key."""
+
+    def version_select(self, *args, **kwargs):
+        """Look for the method which matches the name supplied and version
+        constraints and calls it with the supplied arguments.
+
+        @return: Returns the result of the method called
+        @raises: VersionNotFoundForAPIMethod if there is no method which
+             matches the name and version constraints
+        """
+
+        # The first arg to all versioned methods is always the request
+        # object. The version for the request is attached to the
+        # request object
+        if len(args) == 0:
+            ver = kwargs['req'].api_version_request
+        else:
+            ver = args[0].api_version_request
+        return self.get_versioned_method(key, ver)(*args, **kwargs)
+
+    version_select.__name__ = key
+    version_select.wsgi_versioned = True
+    return version_select
+
+
+def _compile_schema(func):
+    if (hasattr(func, 'wsgi_schema') and
+            not hasattr(func, 'wsgi_validator')):
+        func.wsgi_validator = validation.compile_schema(func.wsgi_schema)
+
+
 class ControllerMetaclass(type):
     """Controller metaclass.
 
@@ -983,6 +1250,7 @@ class ControllerMetaclass(type):
         for key, value in cls_dict.items():
             if not callable(value):
                 continue
+            _compile_schema(value)
             if getattr(value, 'wsgi_action', None):
                 actions[value.wsgi_action] = key
             elif getattr(value, 'wsgi_extends', None):
@@ -992,7 +1260,18 @@ class ControllerMetaclass(type):
         cls_dict['wsgi_actions'] = actions
         cls_dict['wsgi_extensions'] = extensions
         if versioned_methods:
+            for func_list in versioned_methods.values():
+                for func in func_list:
+                    _compile_schema(func.func)
             cls_dict[VER_METHOD_ATTR] = versioned_methods
+            # Versioned methods are reached through one selector each,
+            # built once here rather than on every attribute access.
+            # Building their index rejects overlapping version ranges.
+            cls_dict[VER_INDEX_ATTR] = dict(
+                (key, versioned_method.VersionIndex(key, func_list))
+                for key, func_list in versioned_methods.items())
+            for key in versioned_methods:
+                cls_dict[key] = _version_selector(key)
 
         return super(ControllerMetaclass, mcs).__new__(mcs, name, bases,
                                                        cls_dict)
@@ -1013,48 +1292,17 @@ class Controller(object):
         else:
             self._view_builder = None
 
-    def __getattribute__(self, key):
-
-        def version_select(*args, **kwargs):
-            """Look for the method which matches the name supplied and version
-            constraints and calls it with the supplied arguments.
-
-            @return: Returns the result of the method called
-            @raises: VersionNotFoundForAPIMethod if there is no method which
-                 matches the name and version constraints
-            """
+    def get_versioned_method(self, key, ver):
+        """Return the version of method key matching the requested version.
 
-            # The first arg to all versioned methods is always the request
-            # object. The version for the request is attached to the
-            # request object
-            if len(args) == 0:
-                ver = kwargs['req'].api_version_request
-            else:
-                ver = args[0].api_version_request
-
-            func_list = self.versioned_methods[key]
-            for func in func_list:
-                if ver.matches(func.start_version, func.end_version):
-                    # Update the version_select wrapper function so
-                    # other decorator attributes like wsgi.response
-                    # are still respected.
-                    functools.update_wrapper(version_select, func.func)
-                    return func.func(self, *args, **kwargs)
-
-            # No version match
+        @return: Returns the bound method matching the version
+        @raises: VersionNotFoundForAPIMethod if there is no method which
+             matches the name and version constraints
+        """
+        func = self.versioned_method_index[key].lookup(ver)
+        if func is None:
             raise exception.VersionNotFoundForAPIMethod(version=ver)
-
-        try:
-            version_meth_dict = object.__getattribute__(self, VER_METHOD_ATTR)
-        except AttributeError:
-            # No versioning on this class
-            return object.__getattribute__(self, key)
-
-        if version_meth_dict and \
-                        key in object.__getattribute__(self, VER_METHOD_ATTR):
-            return version_select
-
-        return object.__getattribute__(self, key)
+        return func.func.__get__(self, type(self))
 
     # NOTE(cyeoh): This decorator MUST appear first (the outermost
     # decorator) on an API method for it to work correctly
@@ -1090,13 +1338,8 @@ class Controller(object):
             if not func_list:
                 func_dict[func_name] = func_list
             func_list.append(new_func)
-            # Ensure the list is sorted by minimum version (reversed)
-            # so later when we work through the list in order we find
-            # the method which has the latest version which supports
-            # the version requested.
-            # TODO(cyeoh): Add check to ensure that there are no overlapping
-            # ranges of valid versions as that is amibiguous
-            func_list.sort(key=lambda f: f.start_version, reverse=True)
+            # NOTE: ControllerMetaclass indexes the list by version and
+            # rejects overlapping ranges, which would be ambiguous.
 
             return f
 
@@ -1157,7 +1400,7 @@ class Fault(webob.exc.HTTPException):
             fault_name: {
                 'code': code,
                 'message': explanation}}
-        if code == 413 or code == 429:
+        if code == 413 or code == 429 or code == 503:
             retry = self.wrapped_exc.headers.get('Retry-After', None)
             if retry:
                 fault_data[fault_name]['retryAfter'] = retry
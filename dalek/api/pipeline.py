@@ -0,0 +1,113 @@
+"""Flattening of the API middleware pipeline into a single callable.
+
+Every layer of the paste pipeline is a webob.dec.wsgify callable that
+wraps the WSGI environ into a Request of its own and parses again what
+the layers above already read.  flatten() composes the known layers of
+a pipeline built by auth.pipeline_factory into one callable which makes
+a single dalek.api.openstack.wsgi.Request and passes it down:
+
+* request filters, marked with ``request_filter = True``, whose
+  __call__ returns the next application to pass the request on, or a
+  response to stop there, such as AdaptorContext;
+* FaultWrapper, which turns the exceptions of the layers below into
+  faults;
+* API routers routing through a compiled path trie, whose match is
+  handed to the matched wsgi.Resource directly.
+
+The first layer of another kind ends the flattened part and is called
+as a plain WSGI application, so any pipeline keeps working.
+"""
+
+from oslo.config import cfg
+import webob.dec
+import webob.exc
+
+from dalek.api import openstack
+from dalek.api.openstack import pathtrie
+from dalek.api.openstack import wsgi
+from dalek import wsgi as base_wsgi
+
+pipeline_opts = [
+    cfg.BoolOpt('flatten_api_pipeline',
+                default=True,
+                help='Run the known middlewares of the API pipeline as a '
+                     'single WSGI callable sharing one request object'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(pipeline_opts)
+
+_FILTER = 'filter'
+_FAULT_WRAPPER = 'fault_wrapper'
+_ROUTER = 'router'
+
+
+class FlatPipeline(object):
+    """WSGI app running the layers of a pipeline on a single Request."""
+
+    def __init__(self, stages, application):
+        # (kind, layer) from the outermost layer down
+        self.stages = stages
+        # WSGI app called below the flattened layers, if any
+        self.application = application
+
+    @webob.dec.wsgify(RequestClass=wsgi.Request)
+    def __call__(self, req):
+        return self._run(req, 0)
+
+    def _run(self, req, index):
+        for index in range(index, len(self.stages)):
+            kind, layer = self.stages[index]
+            if kind == _FILTER:
+                result = layer(req)
+                if result is not layer.application:
+                    return result
+            elif kind == _FAULT_WRAPPER:
+                try:
+                    return self._run(req, index + 1)
+                except Exception as ex:
+                    return layer._error(ex, req)
+            else:
+                return self._route(req, layer)
+        # NOTE: the application is called here rather than returned to
+        # wsgify, so that FaultWrapper sees its exceptions.
+        return req.get_response(self.application)
+
+    @staticmethod
+    def _route(req, router):
+        match = router._router.match(req.path_info, req.method)
+        req.environ['wsgiorg.routing_args'] = ((), match or {})
+        if not match:
+            return webob.exc.HTTPNotFound()
+        controller = match['controller']
+        if isinstance(controller, wsgi.Resource):
+            # The resource takes this request as it is, wsgify only wraps
+            # the environ of requests called through WSGI.
+            return controller(req)
+        return req.get_response(controller)
+
+
+def flatten(app):
+    """Return a FlatPipeline running the known layers of app, or app."""
+    if not CONF.flatten_api_pipeline:
+        return app
+
+    stages = []
+    layer = app
+    while True:
+        if getattr(layer, 'request_filter', False):
+            stages.append((_FILTER, layer))
+        elif isinstance(layer, openstack.FaultWrapper):
+            stages.append((_FAULT_WRAPPER, layer))
+        elif (isinstance(layer, base_wsgi.Router) and
+                isinstance(layer._router, pathtrie.TrieRouter)):
+            stages.append((_ROUTER, layer))
+            layer = None
+            break
+        else:
+            break
+        layer = layer.application
+
+    if not stages:
+        return app
+    return FlatPipeline(stages, layer)
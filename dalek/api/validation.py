@@ -0,0 +1,37 @@
+"""Request body validation against JSON schemas.
+
+Schemas attached to controller methods with ``wsgi.schema`` are checked
+and turned into a jsonschema Draft 4 validator once, when their
+controller class is created, rather than on every request.
+"""
+
+import jsonschema
+from jsonschema import exceptions as jsonschema_exc
+import six
+
+from dalek import exception
+from dalek.i18n import _
+
+
+def _detail(error):
+    path = '/'.join(six.text_type(part) for part in error.path)
+    return _("Invalid input for field/attribute %(path)s. Value: "
+             "%(value)s. %(message)s") % {'path': path or '/',
+                                         'value': error.instance,
+                                         'message': error.message}
+
+
+def compile_schema(schema):
+    """Return a function validating a request body against schema.
+
+    The function raises ValidationError describing the most relevant
+    error found.  Invalid schemas are rejected here, when compiling.
+    """
+    jsonschema.Draft4Validator.check_schema(schema)
+    validator = jsonschema.Draft4Validator(schema)
+
+    def validate(body):
+        error = jsonschema_exc.best_match(validator.iter_errors(body))
+        if error is not None:
+            raise exception.ValidationError(detail=_detail(error))
+    return validate
@@ -24,10 +24,16 @@ import sys
 
 from oslo.config import cfg
 
+from dalek.compute import circuit
+from dalek.compute import http_pool
+from dalek.compute import routing
 from dalek import config
+from dalek import offload
 from dalek.openstack.common import log as logging
+from dalek.openstack.common.report import guru_meditation_report as gmr
 from dalek import service
 from dalek import utils
+from dalek import version
 
 CONF = cfg.CONF
 
@@ -38,6 +44,18 @@ def main():
     logging.setup("adaptor")
     utils.monkey_patch()
 
+    gmr.TextGuruMeditation.register_section(
+        'Upstream Circuit Breakers',
+        circuit.CircuitBreakerReportGenerator())
+    gmr.TextGuruMeditation.register_section(
+        'Upstream Endpoints', routing.EndpointReportGenerator())
+    gmr.TextGuruMeditation.register_section(
+        'Upstream Connection Pools',
+        http_pool.ConnectionPoolReportGenerator())
+    gmr.TextGuruMeditation.register_section(
+        'Offloaded Work', offload.OffloadReportGenerator())
+    gmr.TextGuruMeditation.setup_autorun(version)
+
     launcher = service.process_launcher()
     api = 'adaptor'
     server = service.WSGIService(api, use_ssl=False)
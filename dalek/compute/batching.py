@@ -0,0 +1,134 @@
+"""Dataloader-style batching of single-server lookups.
+
+Lookups of individual servers arriving within a short window are
+collected per caller identity and resolved by a single upstream list
+call filtered by UUID.  Each waiting green thread then gets its own
+server back, so callers keep using a single-object method.
+
+This only pays off when upstream honors several ``uuid`` filters in one
+list call for the callers of the API.  Nova ignores the filter for
+non-admin users and keeps a single value for admins, in which case every
+batch costs a list call on top of a lookup per server; batching is
+therefore off by default.
+"""
+
+import sys
+
+import eventlet
+from eventlet import event
+from oslo.config import cfg
+
+from dalek.compute import coalesce
+from dalek.i18n import _LW
+from dalek.openstack.common import log as logging
+
+batching_opts = [
+    cfg.BoolOpt('batch_server_lookups',
+                default=False,
+                help='Whether lookups of single servers arriving close '
+                     'together are resolved by one upstream list call; '
+                     'only enable it when upstream honors several uuid '
+                     'filters in one list call for the users of the API'),
+    cfg.FloatOpt('server_lookup_batch_window',
+                 default=0.005,
+                 help='Number of seconds to collect server lookups before '
+                      'resolving them upstream'),
+    cfg.IntOpt('server_lookup_batch_size',
+               default=100,
+               help='Maximum number of servers resolved by one upstream '
+                    'list call'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(batching_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+class _Batch(object):
+    def __init__(self, context):
+        self.context = context
+        self.waiters = {}
+        self.dispatched = False
+
+
+class ServerLoader(object):
+    """Collects server lookups into batched upstream list calls.
+
+    :param load_many: callable(context, ids) returning a dict of the
+                      servers found upstream, keyed by id
+    :param load_one: callable(context, id) used for ids missing from the
+                     batched response; raises if the server does not exist
+    """
+
+    def __init__(self, load_many, load_one):
+        self._load_many = load_many
+        self._load_one = load_one
+        self._pending = {}
+        # Cleared once upstream is seen ignoring the uuid filter.
+        self._filter_works = True
+
+    @staticmethod
+    def _batch_key(context):
+        # NOTE: a batch runs with the credentials of its first caller, so
+        # it is only shared by callers with the very same identity, which
+        # request_key() includes.
+        return coalesce.request_key(context, 'servers.show')
+
+    def load(self, context, server_id):
+        if not self._filter_works:
+            return self._load_one(context, server_id)
+
+        key = self._batch_key(context)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _Batch(context)
+            self._pending[key] = batch
+            eventlet.spawn_after(CONF.server_lookup_batch_window,
+                                 self._dispatch, key, batch)
+
+        waiter = batch.waiters.get(server_id)
+        if waiter is None:
+            waiter = event.Event()
+            batch.waiters[server_id] = waiter
+            if len(batch.waiters) >= CONF.server_lookup_batch_size:
+                eventlet.spawn_n(self._dispatch, key, batch)
+        return waiter.wait()
+
+    def _dispatch(self, key, batch):
+        if batch.dispatched:
+            return
+        batch.dispatched = True
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+
+        LOG.debug("Resolving %d server lookups in one upstream call",
+                  len(batch.waiters))
+        try:
+            servers = self._load_many(batch.context, list(batch.waiters))
+        except Exception:
+            exc_info = sys.exc_info()
+            for waiter in batch.waiters.values():
+                waiter.send_exception(*exc_info)
+            return
+
+        if self._filter_works and set(servers) - set(batch.waiters):
+            LOG.warning(_LW("Upstream ignores the uuid filter of server "
+                            "lists, no longer batching server lookups"))
+            self._filter_works = False
+
+        for server_id, waiter in batch.waiters.items():
+            if server_id in servers:
+                waiter.send(servers[server_id])
+            else:
+                # Not in the batched response, either because it does not
+                # exist or because upstream ignored the filter for this
+                # user: fall back to a lookup of its own.
+                eventlet.spawn_n(self._resolve_one, batch.context,
+                                 server_id, waiter)
+
+    def _resolve_one(self, context, server_id, waiter):
+        try:
+            waiter.send(self._load_one(context, server_id))
+        except Exception:
+            waiter.send_exception(*sys.exc_info())
@@ -0,0 +1,187 @@
+"""Circuit breakers guarding the upstream endpoints.
+
+Every upstream request is accounted to the breaker of its endpoint.
+Calls failing outright, answered with a 5xx, or slower than
+``circuit_slow_call_seconds`` count as failures.  Once the failure
+ratio over the last ``circuit_window_size`` calls reaches
+``circuit_failure_ratio`` the endpoint is ejected: the breaker opens and
+further calls fail fast with UpstreamUnavailable instead of tying up a
+green thread.  After ``circuit_open_seconds`` a single probe call is let
+through (half-open) and its outcome closes or re-opens the breaker.
+"""
+
+import collections
+import time
+
+from oslo.config import cfg
+
+from dalek import exception
+from dalek.i18n import _LI, _LW
+from dalek.openstack.common import log as logging
+from dalek.openstack.common.report.models import with_default_views as mwdv
+
+circuit_opts = [
+    cfg.BoolOpt('circuit_breaker_enabled',
+                default=True,
+                help='Whether failing upstream endpoints are ejected and '
+                     'calls to them fail fast'),
+    cfg.IntOpt('circuit_window_size',
+               default=20,
+               help='Number of most recent calls to an upstream endpoint '
+                    'the failure ratio is computed over'),
+    cfg.IntOpt('circuit_min_calls',
+               default=10,
+               help='Minimum number of calls in the window before an '
+                    'upstream endpoint can be ejected'),
+    cfg.FloatOpt('circuit_failure_ratio',
+                 default=0.5,
+                 help='Ratio of failed calls in the window at which an '
+                      'upstream endpoint is ejected'),
+    cfg.FloatOpt('circuit_slow_call_seconds',
+                 default=10.0,
+                 help='Upstream calls taking longer than this many seconds '
+                      'count as failures'),
+    cfg.IntOpt('circuit_open_seconds',
+               default=30,
+               help='Number of seconds an ejected upstream endpoint is '
+                    'failed fast before a probe call is let through'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(circuit_opts)
+
+LOG = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# EWMA smoothing factor of the reported latency
+_LATENCY_DECAY = 0.3
+
+
+class CircuitBreaker(object):
+    """Tracks the health of one upstream endpoint."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.state = CLOSED
+        self.opened_at = None
+        self.latency = None
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self._window = collections.deque(maxlen=CONF.circuit_window_size)
+        self._probing = False
+
+    def before_call(self):
+        """Raise UpstreamUnavailable if the endpoint is currently ejected.
+
+        Return whether the call let through is the probe of a half-open
+        breaker.  Every call let through must be followed by after_call(),
+        or by cancel_call() if the endpoint was not called after all.
+        """
+        if self.state == CLOSED:
+            return False
+
+        if self.state == OPEN:
+            retry_after = self.retry_after()
+            if retry_after > 0:
+                self.rejected += 1
+                raise exception.UpstreamUnavailable(endpoint=self.endpoint,
+                                                    retry_after=retry_after)
+            self.state = HALF_OPEN
+
+        # Half-open: let exactly one probe through at a time.
+        if self._probing:
+            self.rejected += 1
+            raise exception.UpstreamUnavailable(endpoint=self.endpoint,
+                                                retry_after=1)
+        self._probing = True
+        return True
+
+    def cancel_call(self, probe):
+        """Forget a call let through by before_call() but never made."""
+        if probe:
+            self._probing = False
+
+    def after_call(self, duration, failed):
+        """Record the outcome of a call let through by before_call()."""
+        self.calls += 1
+        if self.latency is None:
+            self.latency = duration
+        else:
+            self.latency += _LATENCY_DECAY * (duration - self.latency)
+
+        failed = failed or duration > CONF.circuit_slow_call_seconds
+        if failed:
+            self.failures += 1
+
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if failed:
+                self._open()
+            else:
+                LOG.info(_LI("Upstream endpoint %s recovered, closing "
+                             "its circuit"), self.endpoint)
+                self.state = CLOSED
+                self._window.clear()
+            return
+
+        self._window.append(failed)
+        if (self.state == CLOSED and
+                len(self._window) >= CONF.circuit_min_calls and
+                self.failure_ratio() >= CONF.circuit_failure_ratio):
+            self._open()
+
+    def _open(self):
+        LOG.warning(_LW("Ejecting upstream endpoint %(endpoint)s for "
+                        "%(seconds)d seconds"),
+                    {'endpoint': self.endpoint,
+                     'seconds': CONF.circuit_open_seconds})
+        self.state = OPEN
+        self.opened_at = time.time()
+        self._window.clear()
+
+    def failure_ratio(self):
+        if not self._window:
+            return 0.0
+        return float(sum(self._window)) / len(self._window)
+
+    def retry_after(self):
+        if self.state != OPEN:
+            return 0
+        remaining = self.opened_at + CONF.circuit_open_seconds - time.time()
+        return max(int(remaining + 0.5), 0)
+
+    def stats(self):
+        return {'state': self.state,
+                'failure_ratio': round(self.failure_ratio(), 3),
+                'latency': self.latency,
+                'calls': self.calls,
+                'failures': self.failures,
+                'rejected': self.rejected,
+                'retry_after': self.retry_after()}
+
+
+_BREAKERS = {}
+
+
+def get_breaker(endpoint):
+    breaker = _BREAKERS.get(endpoint)
+    if breaker is None:
+        breaker = CircuitBreaker(endpoint)
+        _BREAKERS[endpoint] = breaker
+    return breaker
+
+
+def get_stats():
+    return {endpoint: breaker.stats()
+            for endpoint, breaker in _BREAKERS.items()}
+
+
+class CircuitBreakerReportGenerator(object):
+    """Guru Meditation section listing the upstream circuit breakers."""
+
+    def __call__(self):
+        return mwdv.ModelWithDefaultViews(get_stats())
@@ -0,0 +1,123 @@
+"""Single-flight coalescing of identical concurrent upstream reads.
+
+When many green threads issue the same upstream read at once (dashboards
+of one user polling the same servers), only the first one performs the
+call; the others, made with the same identity, wait for and share its
+result.  Results are handed to every
+waiter as-is, so callers must treat them as read-only.
+"""
+
+import sys
+
+from eventlet import event
+from oslo.config import cfg
+import six
+
+from dalek.openstack.common import log as logging
+
+coalesce_opts = [
+    cfg.BoolOpt('coalesce_upstream_reads',
+                default=True,
+                help='Whether identical concurrent upstream reads are '
+                     'collapsed into a single upstream call'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(coalesce_opts)
+
+LOG = logging.getLogger(__name__)
+
+# Sent to the waiters of a call which did not complete.
+_ABANDONED = object()
+
+
+def normalize_query(query):
+    """Return a hashable, order-independent form of a query dict."""
+    if not query:
+        return ()
+    normalized = []
+    for key, value in query.items():
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(six.text_type(v) for v in value))
+        elif value is not None:
+            value = six.text_type(value)
+        normalized.append((key, value))
+    return tuple(sorted(normalized))
+
+
+def identity_key(context):
+    """Return the hashable identity upstream calls of context are made as.
+
+    Results fetched for one caller depend on its user, roles and token
+    scope, e.g. admin-only attributes or servers filtered by policy, so
+    they are only shared between callers with the same identity.
+    """
+    roles = getattr(context, 'roles', None)
+    return (context.user_id, context.user_name, context.project_id,
+            context.project_name, getattr(context, 'auth_url', None),
+            getattr(context, 'auth_token', None),
+            tuple(sorted(roles)) if roles else None, context.is_admin)
+
+
+def request_key(context, name, query=None):
+    """Build the dedup key of an upstream read.
+
+    Reads are shared between callers of the same identity asking for the
+    same query at the same API microversion.
+    """
+    version = getattr(context, 'api_version_request', None)
+    if version is not None and not version.is_null():
+        version = version.get_string()
+    else:
+        version = None
+    return identity_key(context) + (name, normalize_query(query), version)
+
+
+class SingleFlight(object):
+    """Collapses identical in-flight calls into one."""
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """Call func, or wait for the identical call already in flight."""
+        waiter = self._inflight.get(key)
+        while waiter is not None:
+            result = waiter.wait()
+            if result is not _ABANDONED:
+                self.shared += 1
+                return result
+            waiter = self._inflight.get(key)
+
+        done = event.Event()
+        self._inflight[key] = done
+        self.calls += 1
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            exc_info = sys.exc_info()
+            done.send_exception(*exc_info)
+            six.reraise(*exc_info)
+        else:
+            done.send(result)
+            return result
+        finally:
+            del self._inflight[key]
+            if not done.ready():
+                # NOTE: the call was killed, e.g. by GreenletExit when the
+                # client disconnects or by a Timeout; the waiters make it
+                # again rather than wait forever or share the kill.
+                done.send(_ABANDONED)
+
+
+_SINGLE_FLIGHT = SingleFlight()
+
+
+def call(context, name, query, func, *args, **kwargs):
+    """Run an upstream read through the worker's single-flight group."""
+    if not CONF.coalesce_upstream_reads:
+        return func(*args, **kwargs)
+    return _SINGLE_FLIGHT.do(request_key(context, name, query),
+                             func, *args, **kwargs)
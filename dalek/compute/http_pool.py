@@ -0,0 +1,183 @@
+"""Keep-alive HTTP connection pooling for upstream compute/identity traffic.
+
+A single ConnectionPool is shared by every upstream client in a worker.
+It hands out one requests adapter per upstream endpoint, bounding the
+number of connections (and so of in-flight requests) to that endpoint
+to ``upstream_pool_size``.  Green threads beyond that wait for a free
+connection instead of opening new sockets.
+"""
+
+import time
+
+from eventlet import semaphore
+from oslo.config import cfg
+from requests import adapters
+
+from dalek.compute import circuit
+from dalek.openstack.common import log as logging
+from dalek.openstack.common.report.models import with_default_views as mwdv
+
+CONF = cfg.CONF
+CONF.import_opt('upstream_pool_size', 'dalek.wsgi')
+CONF.import_opt('upstream_pool_idle_timeout', 'dalek.wsgi')
+CONF.import_opt('circuit_breaker_enabled', 'dalek.compute.circuit')
+
+LOG = logging.getLogger(__name__)
+
+
+class PooledAdapter(adapters.HTTPAdapter):
+    """HTTPAdapter shared by every client talking to one endpoint."""
+
+    def __init__(self, endpoint, maxsize):
+        self.endpoint = endpoint
+        self.maxsize = maxsize
+        self.last_used = time.time()
+        self.waits = 0
+        self.wait_time = 0.0
+        self._evicted_requests = 0
+        self._evicted_connections = 0
+        self._slots = semaphore.Semaphore(maxsize)
+        super(PooledAdapter, self).__init__(pool_connections=1,
+                                            pool_maxsize=maxsize,
+                                            pool_block=True)
+
+    @property
+    def in_use(self):
+        return self.maxsize - self._slots.balance
+
+    def send(self, request, **kwargs):
+        breaker = None
+        probe = False
+        if CONF.circuit_breaker_enabled:
+            # Fail fast before queueing for a connection to an ejected
+            # endpoint.
+            breaker = circuit.get_breaker(self.endpoint)
+            probe = breaker.before_call()
+
+        acquired = False
+        start = None
+        failed = True
+        try:
+            if not self._slots.acquire(blocking=False):
+                self.waits += 1
+                wait_start = time.time()
+                self._slots.acquire()
+                self.wait_time += time.time() - wait_start
+            acquired = True
+
+            start = self.last_used = time.time()
+            response = super(PooledAdapter, self).send(request, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            if acquired:
+                self._slots.release()
+            if breaker is not None and start is None:
+                # NOTE: killed or timed out while waiting for a
+                # connection, the endpoint was never called.
+                breaker.cancel_call(probe)
+            elif breaker is not None:
+                breaker.after_call(time.time() - start, failed)
+
+    def close(self):
+        # NOTE: novaclient closes its requests.Session whenever it switches
+        # between Keystone and Nova.  The shared connections must survive
+        # that; they are only closed by evict().
+        pass
+
+    def evict(self):
+        """Close every pooled connection, keeping the statistics."""
+        requests_made, connections = self._counters()
+        self._evicted_requests += requests_made
+        self._evicted_connections += connections
+        super(PooledAdapter, self).close()
+
+    def _counters(self):
+        requests_made = connections = 0
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_made += pool.num_requests
+                connections += pool.num_connections
+        return requests_made, connections
+
+    def stats(self):
+        requests_made, connections = self._counters()
+        requests_made += self._evicted_requests
+        connections += self._evicted_connections
+        return {'hits': max(requests_made - connections, 0),
+                'misses': connections,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+                'in_use': self.in_use,
+                'size': self.maxsize}
+
+
+class ConnectionPool(object):
+    """Per-endpoint pool of keep-alive connections.
+
+    Implements the ``get(url)`` interface novaclient expects from its
+    connection pool, so it can be installed on any HTTPClient.
+    """
+
+    def __init__(self, maxsize=None, idle_timeout=None):
+        self.maxsize = maxsize or CONF.upstream_pool_size
+        self.idle_timeout = (CONF.upstream_pool_idle_timeout
+                             if idle_timeout is None else idle_timeout)
+        self._adapters = {}
+        self._last_sweep = time.time()
+
+    def get(self, url):
+        self._evict_idle()
+        adapter = self._adapters.get(url)
+        if adapter is None:
+            LOG.debug("Creating connection pool of %(size)d for %(url)s",
+                      {'size': self.maxsize, 'url': url})
+            adapter = PooledAdapter(url, self.maxsize)
+            self._adapters[url] = adapter
+        return adapter
+
+    def _evict_idle(self):
+        if not self.idle_timeout:
+            return
+        now = time.time()
+        if now - self._last_sweep < self.idle_timeout:
+            return
+        self._last_sweep = now
+
+        for url, adapter in self._adapters.items():
+            if adapter.in_use == 0 and \
+                    now - adapter.last_used > self.idle_timeout:
+                LOG.debug("Evicting idle connections to %s", url)
+                adapter.evict()
+
+    def stats(self):
+        """Return hit/miss/wait statistics keyed by endpoint."""
+        return {url: adapter.stats()
+                for url, adapter in self._adapters.items()}
+
+
+_POOL = None
+
+
+def get_pool():
+    global _POOL
+    if _POOL is None:
+        _POOL = ConnectionPool()
+    return _POOL
+
+
+def install(client):
+    """Route all of a novaclient client's traffic through the shared pool."""
+    # NOTE: novaclient only exposes an on/off switch for its private
+    # per-client pool, so swap in the worker-wide one.
+    client.client._connection_pool = get_pool()
+    return client
+
+
+class ConnectionPoolReportGenerator(object):
+    """Guru Meditation section listing the upstream connection pools."""
+
+    def __call__(self):
+        return mwdv.ModelWithDefaultViews(get_pool().stats())
@@ -0,0 +1,106 @@
+"""K-way merge of server lists sorted by several upstream endpoints.
+
+Every endpoint returns its servers already sorted on the requested
+keys, so a global order is obtained lazily by a heap merge holding a
+single row per endpoint.
+"""
+
+import heapq
+
+# Server attributes holding the database columns upstream sorts on.
+_SORT_KEY_ATTRS = {
+    'access_ip_v4': 'accessIPv4',
+    'access_ip_v6': 'accessIPv6',
+    'availability_zone': 'OS-EXT-AZ:availability_zone',
+    'created_at': 'created',
+    'display_name': 'name',
+    'host': 'OS-EXT-SRV-ATTR:host',
+    'hostname': 'OS-EXT-SRV-ATTR:hostname',
+    'launched_at': 'OS-SRV-USG:launched_at',
+    'node': 'OS-EXT-SRV-ATTR:hypervisor_hostname',
+    'power_state': 'OS-EXT-STS:power_state',
+    'project_id': 'tenant_id',
+    'task_state': 'OS-EXT-STS:task_state',
+    'terminated_at': 'OS-SRV-USG:terminated_at',
+    'updated_at': 'updated',
+    'uuid': 'id',
+    'vm_state': 'OS-EXT-STS:vm_state',
+}
+
+
+class SortKey(object):
+    """Orders servers on several keys, each ascending or descending."""
+
+    __slots__ = ('values', 'dirs')
+
+    def __init__(self, values, dirs):
+        self.values = values
+        self.dirs = dirs
+
+    def __eq__(self, other):
+        return self.values == other.values
+
+    def __ne__(self, other):
+        return self.values != other.values
+
+    def __lt__(self, other):
+        for mine, theirs, sort_dir in zip(self.values, other.values,
+                                          self.dirs):
+            if mine == theirs:
+                continue
+            # NOTE: missing values sort first, as NULLs do upstream.
+            if mine is None or theirs is None:
+                lower = mine is None
+            else:
+                lower = mine < theirs
+            return lower if sort_dir == 'asc' else not lower
+        return False
+
+
+def server_sort_key(sort_keys, sort_dirs):
+    """Return a function computing the SortKey of a server dict.
+
+    Sort directions missing from sort_dirs default to the last one given,
+    or to descending.
+    """
+    attrs = [_SORT_KEY_ATTRS.get(key, key) for key in sort_keys]
+    dirs = list(sort_dirs[:len(sort_keys)])
+    dirs.extend([dirs[-1] if dirs else 'desc'] * (len(attrs) - len(dirs)))
+
+    def _key(server):
+        return SortKey(tuple(server.get(attr) for attr in attrs), dirs)
+    return _key
+
+
+def _decorate(rows, key, index):
+    for seq, row in enumerate(rows):
+        yield key(row), index, seq, row
+
+
+def merge(streams, key):
+    """Yield the rows of several sorted streams in global order.
+
+    Rows comparing equal are yielded in the order of their streams.
+    """
+    decorated = [_decorate(rows, key, index)
+                 for index, rows in enumerate(streams)]
+    for _key, _index, _seq, row in heapq.merge(*decorated):
+        yield row
+
+
+def skip_to(rows, key, marker_key, inclusive):
+    """Skip the rows of a sorted stream ordered before marker_key.
+
+    :param inclusive: also skip the rows comparing equal to marker_key
+    """
+    rows = iter(rows)
+    for row in rows:
+        row_key = key(row)
+        if row_key < marker_key or (inclusive and row_key == marker_key):
+            continue
+        yield row
+        break
+    else:
+        return
+    for row in rows:
+        yield row
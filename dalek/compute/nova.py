@@ -1,18 +1,657 @@
+"""Handles all requests relating to upstream Nova compute resources."""
+
+import collections
+import contextlib
+import datetime
+import hashlib
+import itertools
+
+import eventlet
+from eventlet import semaphore
 from novaclient import client as nova_client
+from novaclient import exceptions as nova_exceptions
 from oslo.config import cfg
+from oslo.utils import timeutils
+import six
+from six.moves import urllib
+
+from dalek.compute import batching
+from dalek.compute import coalesce
+from dalek.compute import http_pool
+from dalek.compute import merge
+from dalek.compute import routing
+from dalek.compute import transitions
+from dalek import exception
+from dalek.i18n import _LW
 from dalek.openstack.common import log as logging
+from dalek.openstack.common import memorycache
+from dalek import utils
+
+nova_opts = [
+    cfg.StrOpt('nova_auth_url',
+               default='http://10.20.0.7:5000/v2.0',
+               help='Keystone endpoint used to authenticate against '
+                    'upstream Nova when the request context carries none'),
+    cfg.StrOpt('nova_service_type',
+               default='compute',
+               help='Service type of upstream Nova in the service catalog'),
+    cfg.IntOpt('nova_token_refresh_margin',
+               default=300,
+               help='Number of seconds before a cached upstream token '
+                    'expires at which it is proactively refreshed'),
+    cfg.IntOpt('nova_token_default_ttl',
+               default=3600,
+               help='Lifetime in seconds assumed for upstream tokens whose '
+                    'expiry is not reported by Keystone'),
+    cfg.IntOpt('multi_create_concurrency',
+               default=20,
+               help='Maximum number of upstream create calls a worker runs '
+                    'concurrently when fanning out multi-create requests'),
+    cfg.IntOpt('multi_create_max_count',
+               default=100,
+               help='Maximum number of servers a single multi-create '
+                    'request may ask for; the outcome of every server is '
+                    'kept in the reservation, which must fit in a '
+                    'memcached value'),
+    cfg.StrOpt('multi_create_display_name_template',
+               default='%(name)s-%(count)d',
+               help='Template used to name servers of a multi-create '
+                    'request; name and count are substituted'),
+    cfg.IntOpt('reservation_ttl',
+               default=3600,
+               help='Number of seconds the outcome of a multi-create '
+                    'reservation is kept available; reservations are only '
+                    'shared between API workers when memcached_servers is '
+                    'set'),
+    cfg.IntOpt('server_list_page_size',
+               default=1000,
+               help='Number of servers requested per upstream page when '
+                    'listing servers; must not exceed the upstream '
+                    'osapi_max_limit'),
+]
 
 CONF = cfg.CONF
+CONF.register_opts(nova_opts)
+CONF.import_opt('memcached_servers', 'dalek.openstack.common.memorycache')
 
 LOG = logging.getLogger(__name__)
 
+# Maximum number of upstream sessions a worker keeps.
+_MAX_SESSIONS = 1000
+
+
+class _ClientSession(object):
+    """An authenticated upstream client and the expiry of its token."""
+
+    def __init__(self, client, expires_at):
+        self.client = client
+        self.expires_at = expires_at
+
+    def expires_soon(self):
+        return timeutils.is_soon(self.expires_at,
+                                 CONF.nova_token_refresh_margin)
+
+
+class SessionManager(object):
+    """Keeps one authenticated novaclient per user, project and endpoint.
+
+    Tokens are refreshed shortly before they expire.  Freshly issued
+    tokens are published through memorycache so that the other workers
+    forked by ProcessLauncher adopt them instead of authenticating again;
+    this requires ``memcached_servers`` to be set, otherwise the cache
+    is local to each worker.  A token rejected upstream is invalidated
+    in both.
+    """
+
+    def __init__(self):
+        # NOTE: one entry per user, project and endpoint; the least
+        # recently used ones are evicted and authenticate again.
+        self._sessions = utils.LRUCache(_MAX_SESSIONS)
+        self._locks = utils.LRUCache(_MAX_SESSIONS)
+        self._cache = None
+
+    @property
+    def cache(self):
+        # NOTE: created lazily so that each forked worker opens its own
+        # connection to memcached instead of sharing the parent's socket.
+        if self._cache is None:
+            self._cache = memorycache.get_client()
+        return self._cache
+
+    @staticmethod
+    def _session_key(context, endpoint=None):
+        if endpoint is not None:
+            auth_url, region_name = endpoint.auth_url, endpoint.region_name
+        else:
+            auth_url = (getattr(context, 'auth_url', None) or
+                        CONF.nova_auth_url)
+            region_name = None
+        return (context.user_name, context.project_name, auth_url,
+                region_name)
+
+    @staticmethod
+    def _cache_key(key):
+        return 'dalek-nova-token-%s' % hashlib.sha1(
+            '\0'.join(k or '' for k in key)).hexdigest()
+
+    def get_client(self, context, endpoint=None):
+        """Return an authenticated client for the context's credentials.
+
+        :param endpoint: routing.Endpoint to talk to; defaults to the
+                         context's auth_url or nova_auth_url
+        """
+        key = self._session_key(context, endpoint)
+        session = self._sessions.get(key)
+        if session is not None and not session.expires_soon():
+            return session.client
+
+        # Only one green thread per key talks to Keystone, the others
+        # wait and then pick up the refreshed session.
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = semaphore.Semaphore()
+            self._locks.put(key, lock)
+        with lock:
+            session = self._sessions.get(key)
+            if session is None or session.expires_soon():
+                session = (self._load_shared_session(key, context) or
+                           self._authenticate(key, context))
+                self._sessions.put(key, session)
+        return session.client
+
+    def invalidate(self, context, endpoint=None):
+        """Forget the session so the next call authenticates again."""
+        key = self._session_key(context, endpoint)
+        LOG.debug("Forgetting the upstream token of user %(user)s, "
+                  "project %(project)s", {'user': key[0], 'project': key[1]})
+        self._sessions.pop(key)
+        self.cache.delete(self._cache_key(key))
+
+    def _make_client(self, key, context, **kwargs):
+        user_name, project_name, auth_url, region_name = key
+        client = nova_client.Client(2, user_name, context.user_password,
+                                    project_name, auth_url,
+                                    region_name=region_name,
+                                    service_type=CONF.nova_service_type,
+                                    connection_pool=True,
+                                    **kwargs)
+        return http_pool.install(client)
+
+    def _load_shared_session(self, key, context):
+        cached = self.cache.get(self._cache_key(key))
+        if not cached:
+            return None
 
-def novaclient(context):
-    return nova_client.Client(2, 'admin', 'admin', 'admin', 'http://10.20.0.7:5000/v2.0', service_type='compute')
+        expires_at = timeutils.normalize_time(
+            timeutils.parse_isotime(cached['expires']))
+        if timeutils.is_soon(expires_at, CONF.nova_token_refresh_margin):
+            return None
+
+        LOG.debug("Reusing upstream token shared by another worker for "
+                  "user %(user)s, project %(project)s",
+                  {'user': key[0], 'project': key[1]})
+        client = self._make_client(key, context,
+                                   auth_token=cached['token'],
+                                   bypass_url=cached['management_url'])
+        return _ClientSession(client, expires_at)
+
+    def _authenticate(self, key, context):
+        LOG.debug("Authenticating upstream for user %(user)s, "
+                  "project %(project)s against %(auth_url)s",
+                  {'user': key[0], 'project': key[1], 'auth_url': key[2]})
+        client = self._make_client(key, context)
+        client.authenticate()
+
+        http_client = client.client
+        expires_at = self._token_expiry(http_client)
+        ttl = int(timeutils.delta_seconds(timeutils.utcnow(), expires_at))
+        if ttl > 0:
+            self.cache.set(self._cache_key(key),
+                           {'token': http_client.auth_token,
+                            'management_url': http_client.management_url,
+                            'expires': timeutils.isotime(expires_at)},
+                           time=ttl)
+        return _ClientSession(client, expires_at)
+
+    @staticmethod
+    def _token_expiry(http_client):
+        try:
+            catalog = http_client.service_catalog.catalog
+            expires = catalog['access']['token']['expires']
+        except (AttributeError, KeyError, TypeError):
+            expires = None
+
+        if expires:
+            return timeutils.normalize_time(timeutils.parse_isotime(expires))
+        return timeutils.utcnow() + datetime.timedelta(
+            seconds=CONF.nova_token_default_ttl)
+
+
+_SESSIONS = SessionManager()
+
+
+def novaclient(context, endpoint=None):
+    return _SESSIONS.get_client(context, endpoint)
+
+
+_CREATE_POOL = None
+
+
+def _get_create_pool():
+    global _CREATE_POOL
+    if _CREATE_POOL is None:
+        _CREATE_POOL = eventlet.GreenPool(CONF.multi_create_concurrency)
+    return _CREATE_POOL
 
 
 class API(object):
-    def create(self, context):
-        # TODO
-        client = novaclient(context)
-        return client.create()
+    def __init__(self):
+        self._reservations = memorycache.get_client()
+        self._warned_local_cache = False
+        self._router = routing.get_router()
+        self._states = transitions.StateCache()
+        self._server_loader = batching.ServerLoader(self._get_many,
+                                                    self._get_one)
+
+    @contextlib.contextmanager
+    def _track(self, context, endpoint):
+        """Account a call to endpoint made with the context's session."""
+        try:
+            with self._router.track(endpoint):
+                yield
+        except nova_exceptions.Unauthorized:
+            # NOTE: the token was revoked or rejected before its expiry;
+            # it is forgotten here and in the shared cache so that no
+            # worker keeps adopting it.
+            _SESSIONS.invalidate(context, endpoint)
+            raise
+
+    def get(self, context, instance_id, want_objects=False,
+            expected_attrs=None):
+        """Return the upstream representation of a single server.
+
+        Concurrent lookups are batched into one upstream list call when
+        batch_server_lookups is enabled.
+        """
+        if CONF.batch_server_lookups:
+            return self._server_loader.load(context, instance_id)
+        return self._get_one(context, instance_id)
+
+    def get_many(self, context, instance_ids):
+        """Return the servers among instance_ids found upstream, by id.
+
+        Servers missing from the result may still exist upstream; callers
+        wanting certainty look them up with get().
+        """
+        return self._get_many(context, instance_ids)
+
+    def _get_one(self, context, instance_id):
+        # Try the endpoint the server was last seen on first, then the
+        # others from the fastest to the slowest.
+        for endpoint in self._router.candidates(instance_id):
+            client = novaclient(context, endpoint)
+            try:
+                with self._track(context, endpoint):
+                    server = client.servers.get(instance_id)._info
+            except nova_exceptions.NotFound:
+                continue
+            self._remember_servers([server], endpoint)
+            return server
+
+        self._router.forget(instance_id)
+        raise exception.InstanceNotFound(instance_id=instance_id)
+
+    def _get_many(self, context, instance_ids):
+        # Servers of unknown location are looked for on a single endpoint;
+        # the ones not found there fall back to _get_one().
+        by_endpoint = collections.defaultdict(list)
+        unknown_endpoint = None
+        for instance_id in instance_ids:
+            endpoint = self._router.lookup(instance_id)
+            if endpoint is None:
+                endpoint = unknown_endpoint = (unknown_endpoint or
+                                               self._router.choose())
+            by_endpoint[endpoint].append(instance_id)
+
+        greenthreads = [eventlet.spawn(self._get_many_from, context,
+                                       endpoint, ids)
+                        for endpoint, ids in by_endpoint.items()]
+        servers = {}
+        for greenthread in greenthreads:
+            servers.update(greenthread.wait())
+        return servers
+
+    def _get_many_from(self, context, endpoint, instance_ids):
+        client = novaclient(context, endpoint)
+        query = [('uuid', instance_id) for instance_id in instance_ids]
+        query.append(('limit', len(instance_ids)))
+        with self._track(context, endpoint):
+            _resp, body = client.client.get('/servers/detail?%s' %
+                                            urllib.parse.urlencode(query))
+        servers = body.get('servers', [])
+        self._remember_servers(servers, endpoint)
+        return {server['id']: server for server in servers}
+
+    def _remember_servers(self, servers, endpoint):
+        """Record where servers live and the state they were seen in."""
+        self._router.remember_servers(servers, endpoint)
+        for server in servers:
+            self._states.record(server)
+
+    def _call_on_server(self, context, instance_id, method, func,
+                        action=None):
+        """Run func(client, instance_id) on the endpoint holding the server.
+
+        Actions the recently seen state of the server does not allow are
+        refused locally.  Upstream conflicts are raised as
+        InstanceInvalidState carrying the upstream message.
+
+        :param action: transitions action checked against the state of the
+                       server; defaults to method
+        """
+        self._states.check(instance_id, action or method, method)
+        # The state is about to change, it must be seen again.
+        self._states.forget(instance_id)
+
+        for endpoint in self._router.candidates(instance_id):
+            client = novaclient(context, endpoint)
+            try:
+                with self._track(context, endpoint):
+                    result = func(client, instance_id)
+            except nova_exceptions.NotFound:
+                continue
+            except nova_exceptions.Conflict as e:
+                self._router.remember(instance_id, endpoint)
+                raise exception.InstanceInvalidState(
+                    six.text_type(e.message), instance_uuid=instance_id,
+                    method=method)
+            self._router.remember(instance_id, endpoint)
+            return result
+
+        self._router.forget(instance_id)
+        raise exception.InstanceNotFound(instance_id=instance_id)
+
+    def reboot(self, context, instance_id, reboot_type):
+        if reboot_type == 'HARD':
+            action = transitions.HARD_REBOOT
+        else:
+            action = transitions.SOFT_REBOOT
+        self._call_on_server(
+            context, instance_id, 'reboot',
+            lambda client, server: client.servers.reboot(server,
+                                                         reboot_type),
+            action=action)
+
+    def start(self, context, instance_id):
+        self._call_on_server(
+            context, instance_id, 'start',
+            lambda client, server: client.servers.start(server),
+            action=transitions.START)
+
+    def stop(self, context, instance_id):
+        self._call_on_server(
+            context, instance_id, 'stop',
+            lambda client, server: client.servers.stop(server),
+            action=transitions.STOP)
+
+    def delete(self, context, instance_id):
+        self._call_on_server(
+            context, instance_id, 'delete',
+            lambda client, server: client.servers.delete(server),
+            action=transitions.DELETE)
+
+    def create(self, context, name, image, flavor, **kwargs):
+        """Create a single server and return its upstream representation.
+
+        The server is created on the better of two randomly picked
+        upstream endpoints.
+        """
+        endpoint = self._router.choose()
+        client = novaclient(context, endpoint)
+        with self._track(context, endpoint):
+            server = client.servers.create(name, image, flavor, **kwargs)
+        self._router.remember(server.id, endpoint)
+        return server._info
+
+    def get_all_pages(self, context, detailed=True, search_opts=None,
+                      limit=None, marker=None, sort_keys=None,
+                      sort_dirs=None, endpoint=None):
+        """Return an iterator over the matching servers, page by page.
+
+        Upstream pagination markers are followed internally until limit
+        servers were returned or the upstream list is exhausted.  While the
+        caller consumes page N, page N+1 is already being fetched.
+
+        Detailed lists not bound to an endpoint are aggregated over every
+        configured upstream endpoint, merged on sort_keys.
+
+        :param endpoint: routing.Endpoint to list; defaults to all of them
+                         for detailed lists and to the first configured one
+                         otherwise
+        """
+        if (endpoint is None and detailed and
+                len(self._router.endpoints) > 1):
+            return self._get_merged_pages(context, search_opts, limit,
+                                          marker, sort_keys or [],
+                                          sort_dirs or [])
+        return self._get_pages(context, endpoint or self._router.primary,
+                               detailed, search_opts, limit, marker,
+                               sort_keys, sort_dirs)
+
+    def _get_merged_pages(self, context, search_opts, limit, marker,
+                          sort_keys, sort_dirs):
+        """Yield pages of the servers of every endpoint in global order.
+
+        All endpoints are listed concurrently.  Their sorted streams are
+        combined by a heap merge, so only the pages being merged are held
+        and listing stops as soon as limit servers were yielded.
+        """
+        endpoints = self._router.endpoints
+        key = merge.server_sort_key(sort_keys, sort_dirs)
+
+        home = marker_key = None
+        if marker is not None:
+            # Upstream only knows the marker on the endpoint it lives on;
+            # the other endpoints are skipped past its sort key locally.
+            try:
+                marker_key = key(self._get_one(context, marker))
+            except exception.InstanceNotFound:
+                raise exception.MarkerNotFound(marker=marker)
+            home = self._router.lookup(marker)
+        home_index = endpoints.index(home) if home is not None else -1
+
+        page_iters = [self._get_pages(context, endpoint, True, search_opts,
+                                      limit if marker_key is None or
+                                      endpoint is home else None,
+                                      marker if endpoint is home else None,
+                                      sort_keys, sort_dirs)
+                      for endpoint in endpoints]
+        first_pages = [eventlet.spawn(next, pages, [])
+                       for pages in page_iters]
+        try:
+            streams = []
+            for index, pages in enumerate(page_iters):
+                rows = itertools.chain.from_iterable(
+                    itertools.chain([first_pages[index].wait()], pages))
+                if marker_key is not None and endpoints[index] is not home:
+                    rows = merge.skip_to(rows, key, marker_key,
+                                         inclusive=index < home_index)
+                streams.append(rows)
+
+            rows = merge.merge(streams, key)
+            if limit is not None:
+                rows = itertools.islice(rows, limit)
+            page = []
+            for row in rows:
+                page.append(row)
+                if len(page) == CONF.server_list_page_size:
+                    yield page
+                    page = []
+            if page:
+                yield page
+        finally:
+            for first_page in first_pages:
+                first_page.kill()
+            for pages in page_iters:
+                pages.close()
+
+    def _get_pages(self, context, endpoint, detailed, search_opts, limit,
+                   marker, sort_keys, sort_dirs):
+        client = novaclient(context, endpoint)
+        path = '/servers/detail' if detailed else '/servers'
+
+        def _list(marker, count):
+            # NOTE: built by hand as the client cannot repeat sort_key.
+            query = [(k, v) for k, v in (search_opts or {}).items() if v]
+            query.extend(('sort_key', sort_key)
+                         for sort_key in sort_keys or [])
+            query.extend(('sort_dir', sort_dir)
+                         for sort_dir in sort_dirs or [])
+            if marker:
+                query.append(('marker', marker))
+            query.append(('limit', count))
+            with self._track(context, endpoint):
+                _resp, body = client.client.get(
+                    '%s?%s' % (path, urllib.parse.urlencode(query)))
+            servers = body.get('servers', [])
+            self._remember_servers(servers, endpoint)
+            return servers
+
+        def _fetch(marker, count):
+            # NOTE: sort keys are joined as their order matters.
+            query = dict(search_opts or {}, marker=marker, limit=count,
+                         sort_key=','.join(sort_keys or []),
+                         sort_dir=','.join(sort_dirs or []))
+            name = '%s@%s' % ('servers.detail' if detailed
+                              else 'servers.index', endpoint.name)
+            return coalesce.call(context, name, query, _list, marker, count)
+
+        def _page_size(remaining):
+            if remaining is None:
+                return CONF.server_list_page_size
+            return min(CONF.server_list_page_size, remaining)
+
+        remaining = limit
+        count = _page_size(remaining)
+        next_page = eventlet.spawn(_fetch, marker, count)
+        try:
+            while next_page is not None:
+                page = next_page.wait()
+                next_page = None
+                if remaining is not None:
+                    remaining -= len(page)
+                if len(page) == count and remaining != 0:
+                    count = _page_size(remaining)
+                    next_page = eventlet.spawn(_fetch, page[-1]['id'], count)
+                if page:
+                    yield page
+        finally:
+            # The consumer may stop early, e.g. when the client disconnects.
+            if next_page is not None:
+                next_page.kill()
+
+    def create_multiple(self, context, name, image, flavor, min_count,
+                        max_count, **kwargs):
+        """Start creating max_count servers and return their reservation.
+
+        Each server is created by its own upstream call, spread over a
+        bounded pool of green threads shared by the worker.  All servers
+        of a reservation are created on the same upstream endpoint.  The call
+        returns straight away; the progress and per-server outcome can be
+        followed through get_reservation().
+
+        Reservations are kept in memorycache: unless ``memcached_servers``
+        is set they only exist in the worker which created them, and the
+        other workers of the API report them as not found.
+        """
+        if not CONF.memcached_servers and not self._warned_local_cache:
+            LOG.warning(_LW("memcached_servers is not set, multi-create "
+                            "reservations can only be looked up on the "
+                            "API worker which created them"))
+            self._warned_local_cache = True
+        reservation = {'reservation_id': utils.generate_uid('r'),
+                       'project_id': context.project_id,
+                       'status': 'BUILDING',
+                       'min_count': min_count,
+                       'max_count': max_count,
+                       'servers': [],
+                       'errors': []}
+        self._save_reservation(reservation)
+        utils.spawn_n(self._fan_out_create, context, reservation, name,
+                      image, flavor, kwargs)
+        return reservation
+
+    def get_reservation(self, context, reservation_id):
+        reservation = self._reservations.get(
+            self._reservation_key(reservation_id))
+        if (not reservation or
+                reservation['project_id'] != context.project_id):
+            raise exception.ReservationNotFound(
+                reservation_id=reservation_id)
+        return reservation
+
+    def _fan_out_create(self, context, reservation, name, image, flavor,
+                        kwargs):
+        def _server_name(index):
+            return CONF.multi_create_display_name_template % {
+                'name': name, 'count': index + 1}
+
+        def _record_error(index, error):
+            LOG.warning(_LW("Creating server %(index)d of reservation "
+                            "%(reservation)s failed: %(error)s"),
+                        {'index': index + 1, 'error': error,
+                         'reservation': reservation['reservation_id']})
+            reservation['errors'].append({'index': index + 1,
+                                          'name': _server_name(index),
+                                          'message': six.text_type(error)})
+
+        # NOTE: this runs in its own green thread, a failure to set up the
+        # client must end the reservation rather than leave it BUILDING.
+        try:
+            endpoint = self._router.choose()
+            client = novaclient(context, endpoint)
+        except Exception as e:
+            for index in range(reservation['max_count']):
+                _record_error(index, e)
+            reservation['status'] = 'ERROR'
+            self._save_reservation(reservation)
+            return
+        pool = _get_create_pool()
+
+        def _create_one(index):
+            server_name = _server_name(index)
+            try:
+                with self._track(context, endpoint):
+                    server = client.servers.create(server_name, image,
+                                                   flavor, **kwargs)
+            except Exception as e:
+                _record_error(index, e)
+            else:
+                self._router.remember(server.id, endpoint)
+                reservation['servers'].append({'index': index + 1,
+                                               'id': server.id,
+                                               'name': server_name})
+            self._save_reservation(reservation)
+
+        greenthreads = [pool.spawn(_create_one, index)
+                        for index in range(reservation['max_count'])]
+        for greenthread in greenthreads:
+            greenthread.wait()
+
+        created = len(reservation['servers'])
+        if created == reservation['max_count']:
+            reservation['status'] = 'ACTIVE'
+        elif created >= reservation['min_count']:
+            reservation['status'] = 'PARTIAL'
+        else:
+            reservation['status'] = 'ERROR'
+        self._save_reservation(reservation)
+
+    @staticmethod
+    def _reservation_key(reservation_id):
+        return 'dalek-reservation-%s' % reservation_id
+
+    def _save_reservation(self, reservation):
+        self._reservations.set(
+            self._reservation_key(reservation['reservation_id']),
+            reservation, time=CONF.reservation_ttl)
@@ -0,0 +1,192 @@
+"""Shared polling of the status of watched servers.
+
+Clients waiting for a server to change status register a watch instead
+of polling upstream themselves.  A single green thread per worker then
+refreshes every server watched by a caller with one batched upstream
+list call per ``status_poll_interval`` and wakes up the watchers whose
+server changed status.
+"""
+
+import sys
+
+import eventlet
+from eventlet import event
+from oslo.config import cfg
+
+from dalek.compute import coalesce
+from dalek.i18n import _LE
+from dalek.openstack.common import log as logging
+
+poller_opts = [
+    cfg.FloatOpt('status_poll_interval',
+                 default=2.0,
+                 help='Number of seconds between two upstream refreshes of '
+                      'the watched servers'),
+    cfg.IntOpt('status_watch_timeout',
+               default=60,
+               help='Maximum number of seconds a watch request waits for '
+                    'a server to change status'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(poller_opts)
+CONF.import_opt('server_lookup_batch_size', 'dalek.compute.batching')
+
+LOG = logging.getLogger(__name__)
+
+
+class _Watch(object):
+    """Latest known state of one watched server."""
+
+    def __init__(self):
+        self.server = None
+        self.status = None
+        self.error = None
+        self.changed = event.Event()
+        self.watchers = 0
+
+
+class _Group(object):
+    """Watched servers polled with the credentials of one caller."""
+
+    def __init__(self, key, context):
+        self.key = key
+        self.context = context
+        self.watches = {}
+
+
+class StatusPoller(object):
+    """Refreshes watched servers in batches and notifies their watchers.
+
+    :param load_many: callable(context, ids) returning a dict of the
+                      servers found upstream, keyed by id
+    :param load_one: callable(context, id) used for ids missing from the
+                     batched response; raises if the server does not exist
+    :param status_func: callable(server) returning the status of a server
+    """
+
+    def __init__(self, load_many, load_one, status_func):
+        self._load_many = load_many
+        self._load_one = load_one
+        self._status_func = status_func
+        self._groups = {}
+        self._poller = None
+
+    def watch(self, context, server_id, known_status=None, timeout=None):
+        """Wait for the status of a server to differ from known_status.
+
+        Returns the latest server once its status differs from
+        known_status, or once timeout seconds passed.  Raises what the
+        upstream lookup of the server raised, e.g. InstanceNotFound.
+        """
+        if timeout is None or timeout > CONF.status_watch_timeout:
+            timeout = CONF.status_watch_timeout
+
+        # NOTE: servers are polled with the credentials of the group, so
+        # a group is only shared by watchers with the very same identity.
+        key = coalesce.request_key(context, 'servers.watch')
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _Group(key, context)
+        watch = group.watches.get(server_id)
+        if watch is None:
+            watch = group.watches[server_id] = _Watch()
+        self._ensure_polling()
+
+        watch.watchers += 1
+        try:
+            with eventlet.Timeout(timeout, False):
+                while (watch.error is None and
+                       (watch.server is None or
+                        watch.status == known_status)):
+                    watch.changed.wait()
+        finally:
+            watch.watchers -= 1
+
+        if watch.error is not None:
+            raise watch.error
+        if watch.server is None:
+            # Timed out before the first refresh came back.
+            return self._load_one(context, server_id)
+        return watch.server
+
+    def _ensure_polling(self):
+        if self._poller is None:
+            self._poller = eventlet.spawn(self._poll_forever)
+
+    def _poll_forever(self):
+        try:
+            while self._groups:
+                self._poll_once()
+                eventlet.sleep(CONF.status_poll_interval)
+        finally:
+            self._poller = None
+
+    def _poll_once(self):
+        greenthreads = []
+        for key, group in list(self._groups.items()):
+            # Forget servers nobody waited for since the last refresh.
+            for server_id, watch in list(group.watches.items()):
+                if not watch.watchers and watch.server is not None:
+                    del group.watches[server_id]
+            if not group.watches:
+                del self._groups[key]
+                continue
+
+            server_ids = list(group.watches)
+            for start in range(0, len(server_ids),
+                               CONF.server_lookup_batch_size):
+                chunk = server_ids[start:start +
+                                   CONF.server_lookup_batch_size]
+                greenthreads.append(eventlet.spawn(self._refresh, group,
+                                                   chunk))
+        for greenthread in greenthreads:
+            greenthread.wait()
+
+    def _refresh(self, group, server_ids):
+        try:
+            servers = self._load_many(group.context, server_ids)
+        except Exception as e:
+            if getattr(e, 'code', None) in (401, 403):
+                # The credentials of the group are no longer valid; its
+                # watchers get the error and later watches start a new
+                # group.
+                self._drop(group, e)
+                return
+            # Watchers keep waiting; the next interval tries again.
+            LOG.exception(_LE("Refreshing %d watched servers failed"),
+                          len(server_ids))
+            return
+
+        for server_id in server_ids:
+            server = servers.get(server_id)
+            error = None
+            if server is None:
+                # Not in the batched response, either because it is gone
+                # or because upstream ignored the filter for this user.
+                try:
+                    server = self._load_one(group.context, server_id)
+                except Exception:
+                    error = sys.exc_info()[1]
+            self._update(group, server_id, server, error)
+
+    def _drop(self, group, error):
+        if self._groups.get(group.key) is group:
+            del self._groups[group.key]
+        for server_id in list(group.watches):
+            self._update(group, server_id, None, error)
+
+    def _update(self, group, server_id, server, error):
+        watch = group.watches.get(server_id)
+        if watch is None:
+            return
+        status = self._status_func(server) if server is not None else None
+        first = watch.server is None and watch.error is None
+        watch.server = server
+        watch.error = error
+        if first or error is not None or status != watch.status:
+            watch.status = status
+            changed, watch.changed = watch.changed, event.Event()
+            changed.send()
+        if error is not None:
+            del group.watches[server_id]
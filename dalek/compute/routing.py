@@ -0,0 +1,185 @@
+"""Latency-aware routing of upstream calls across Nova endpoints.
+
+Several upstream regions or cells can be served by one adaptor.  Each
+is described by an entry of ``nova_endpoints``: a Keystone URL,
+optionally followed by ``#<region name>`` when one Keystone fronts
+several regions.  Without entries the single ``nova_auth_url`` is used.
+
+Calls that are not tied to a server, such as creates, go to the better
+of two randomly picked endpoints, judged by their EWMA latency and the
+number of calls in flight.  Servers whose location is known are routed
+to their endpoint through a bounded, worker-local UUID index that is
+filled from every upstream answer carrying servers.
+"""
+
+import collections
+import contextlib
+import random
+import time
+
+from novaclient import exceptions as nova_exceptions
+from oslo.config import cfg
+
+from dalek import exception
+from dalek.openstack.common.report.models import with_default_views as mwdv
+
+routing_opts = [
+    cfg.ListOpt('nova_endpoints',
+                default=[],
+                help='Upstream Nova endpoints requests are spread over, '
+                     'each a Keystone URL optionally followed by '
+                     '"#<region name>"; defaults to nova_auth_url'),
+    cfg.IntOpt('server_endpoint_index_size',
+               default=100000,
+               help='Maximum number of server UUIDs whose upstream endpoint '
+                    'a worker remembers'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(routing_opts)
+CONF.import_opt('circuit_slow_call_seconds', 'dalek.compute.circuit')
+
+# EWMA smoothing factor of the endpoint latency
+_LATENCY_DECAY = 0.3
+
+
+class Endpoint(object):
+    """One upstream Nova deployment and its observed latency."""
+
+    def __init__(self, auth_url, region_name=None):
+        self.auth_url = auth_url
+        self.region_name = region_name
+        self.latency = None
+        self.inflight = 0
+        self.calls = 0
+        self.failures = 0
+
+    @classmethod
+    def parse(cls, entry):
+        auth_url, _sep, region_name = entry.strip().partition('#')
+        return cls(auth_url, region_name or None)
+
+    @property
+    def name(self):
+        if self.region_name:
+            return '%s#%s' % (self.auth_url, self.region_name)
+        return self.auth_url
+
+    def score(self):
+        # NOTE: endpoints not measured yet score best so they get probed.
+        return (self.latency or 0.0) * (self.inflight + 1)
+
+    def record(self, duration, failed):
+        self.calls += 1
+        if failed:
+            # Failures are accounted as slow calls, steering traffic away.
+            self.failures += 1
+            duration = max(duration, CONF.circuit_slow_call_seconds)
+        if self.latency is None:
+            self.latency = duration
+        else:
+            self.latency += _LATENCY_DECAY * (duration - self.latency)
+
+    def stats(self):
+        return {'latency': self.latency,
+                'inflight': self.inflight,
+                'calls': self.calls,
+                'failures': self.failures}
+
+    def __repr__(self):
+        return '<Endpoint %s>' % self.name
+
+
+def _is_failure(error):
+    if isinstance(error, exception.UpstreamUnavailable):
+        return True
+    if isinstance(error, nova_exceptions.ClientException):
+        return (error.code or 500) >= 500
+    return True
+
+
+class Router(object):
+    """Picks the upstream endpoint of each call."""
+
+    def __init__(self, endpoints):
+        self.endpoints = endpoints
+        self._index = collections.OrderedDict()
+
+    @property
+    def primary(self):
+        return self.endpoints[0]
+
+    def choose(self):
+        """Return the better of two randomly picked endpoints."""
+        if len(self.endpoints) == 1:
+            return self.endpoints[0]
+        first, second = random.sample(self.endpoints, 2)
+        return first if first.score() <= second.score() else second
+
+    def candidates(self, server_id):
+        """Return every endpoint, the likeliest home of server_id first."""
+        home = self.lookup(server_id)
+        others = sorted((endpoint for endpoint in self.endpoints
+                         if endpoint is not home),
+                        key=lambda endpoint: endpoint.score())
+        return [home] + others if home is not None else others
+
+    def lookup(self, server_id):
+        endpoint = self._index.pop(server_id, None)
+        if endpoint is not None:
+            self._index[server_id] = endpoint
+        return endpoint
+
+    def remember(self, server_id, endpoint):
+        self._index.pop(server_id, None)
+        self._index[server_id] = endpoint
+        while len(self._index) > CONF.server_endpoint_index_size:
+            self._index.popitem(last=False)
+
+    def remember_servers(self, servers, endpoint):
+        for server in servers:
+            self.remember(server['id'], endpoint)
+
+    def forget(self, server_id):
+        self._index.pop(server_id, None)
+
+    @contextlib.contextmanager
+    def track(self, endpoint):
+        """Account the latency and outcome of a call to endpoint."""
+        endpoint.inflight += 1
+        start = time.time()
+        failed = False
+        try:
+            yield endpoint
+        except Exception as e:
+            failed = _is_failure(e)
+            raise
+        finally:
+            endpoint.inflight -= 1
+            endpoint.record(time.time() - start, failed)
+
+    def stats(self):
+        stats = {endpoint.name: endpoint.stats()
+                 for endpoint in self.endpoints}
+        stats['indexed_servers'] = len(self._index)
+        return stats
+
+
+_ROUTER = None
+
+
+def get_router():
+    global _ROUTER
+    if _ROUTER is None:
+        # NOTE: nova_auth_url is registered by dalek.compute.nova, which
+        # imports this module.
+        entries = CONF.nova_endpoints or [CONF.nova_auth_url]
+        _ROUTER = Router([Endpoint.parse(entry) for entry in entries])
+    return _ROUTER
+
+
+class EndpointReportGenerator(object):
+    """Guru Meditation section listing the upstream endpoints."""
+
+    def __call__(self):
+        return mwdv.ModelWithDefaultViews(get_router().stats())
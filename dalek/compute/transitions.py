@@ -0,0 +1,145 @@
+"""Local validation of server actions against the server's known state.
+
+Upstream Nova refuses actions on servers in the wrong vm_state or
+task_state with a 409.  The same rules are precomputed here into a
+table covering every (vm_state, task_state, action) combination, so an
+action on a server whose state was seen recently can be refused without
+an upstream round-trip.  Actions on servers of unknown or stale state
+are always passed on upstream, which stays the authority.
+"""
+
+import time
+
+from oslo.config import cfg
+
+from dalek.compute import task_states
+from dalek.compute import vm_states
+from dalek import exception
+
+transitions_opts = [
+    cfg.IntOpt('server_state_cache_ttl',
+               default=3,
+               help='Number of seconds the state of a server seen upstream '
+                    'is trusted to refuse invalid actions locally; 0 '
+                    'disables local refusals'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(transitions_opts)
+
+SOFT_REBOOT = 'soft_reboot'
+HARD_REBOOT = 'hard_reboot'
+START = 'start'
+STOP = 'stop'
+DELETE = 'delete'
+
+
+def _states(module):
+    return [value for name, value in vars(module).items()
+            if name.isupper() and isinstance(value, str)]
+
+
+_ALL_TASK_STATES = _states(task_states) + [None]
+
+_REBOOT_VM_STATES = set(vm_states.ALLOW_SOFT_REBOOT +
+                        vm_states.ALLOW_HARD_REBOOT)
+_REBOOT_TASK_STATES = [None,
+                       task_states.REBOOTING,
+                       task_states.REBOOT_PENDING,
+                       task_states.REBOOT_STARTED,
+                       task_states.REBOOTING_HARD,
+                       task_states.RESUMING,
+                       task_states.UNPAUSING,
+                       task_states.PAUSING,
+                       task_states.SUSPENDING]
+# Refused by the body of the upstream reboot() once the decorator passed.
+_SOFT_REBOOT_REFUSED_TASK_STATES = [task_states.REBOOTING,
+                                    task_states.REBOOTING_HARD,
+                                    task_states.REBOOT_PENDING_HARD,
+                                    task_states.REBOOT_STARTED_HARD]
+_HARD_REBOOT_REFUSED_TASK_STATES = [task_states.REBOOTING_HARD]
+
+# action: [(attr, allowed states), ...] checked in turn, the first
+# failing check giving the refusal.  Mirrors the check_instance_state
+# decorators and the checks made in the body of the upstream compute API
+# methods, in the same order; a local refusal must never be stricter.
+_RULES = {
+    SOFT_REBOOT: [('vm_state', _REBOOT_VM_STATES),
+                  ('task_state', _REBOOT_TASK_STATES),
+                  ('vm_state', vm_states.ALLOW_SOFT_REBOOT),
+                  ('task_state',
+                   [state for state in _ALL_TASK_STATES
+                    if state not in _SOFT_REBOOT_REFUSED_TASK_STATES])],
+    HARD_REBOOT: [('vm_state', _REBOOT_VM_STATES),
+                  ('task_state', _REBOOT_TASK_STATES),
+                  ('task_state',
+                   [state for state in _ALL_TASK_STATES
+                    if state not in _HARD_REBOOT_REFUSED_TASK_STATES])],
+    START: [('vm_state', [vm_states.STOPPED]), ('task_state', [None])],
+    STOP: [('vm_state', [vm_states.ACTIVE, vm_states.RESCUED,
+                         vm_states.ERROR]),
+           ('task_state', [None])],
+    DELETE: [],
+}
+
+
+def _build_table():
+    """Map (vm_state, task_state, action) to the offending (attr, state)."""
+    table = {}
+    for action, checks in _RULES.items():
+        for vm_state in _states(vm_states):
+            for task_state in _ALL_TASK_STATES:
+                states = {'vm_state': vm_state, 'task_state': task_state}
+                for attr, allowed in checks:
+                    if states[attr] not in allowed:
+                        table[vm_state, task_state, action] = (
+                            attr, states[attr])
+                        break
+    return table
+
+
+_TABLE = _build_table()
+
+
+class StateCache(object):
+    """Recently seen vm_state and task_state of servers, by id."""
+
+    def __init__(self):
+        self._states = {}
+        self._last_sweep = time.time()
+
+    def record(self, server):
+        # NOTE: states are only reported with the extended status
+        # attributes, other servers are never refused locally.
+        ttl = CONF.server_state_cache_ttl
+        if ttl <= 0 or 'OS-EXT-STS:vm_state' not in server:
+            return
+        now = time.time()
+        self._states[server['id']] = (server['OS-EXT-STS:vm_state'],
+                                      server.get('OS-EXT-STS:task_state'),
+                                      now)
+        if now - self._last_sweep > ttl:
+            self._last_sweep = now
+            for server_id, (_vm, _task, seen_at) in self._states.items():
+                if now - seen_at > ttl:
+                    del self._states[server_id]
+
+    def forget(self, server_id):
+        self._states.pop(server_id, None)
+
+    def check(self, server_id, action, method):
+        """Raise InstanceInvalidState if the recent state forbids action."""
+        state = self._states.get(server_id)
+        if state is None:
+            return
+        vm_state, task_state, seen_at = state
+        if time.time() - seen_at > CONF.server_state_cache_ttl:
+            del self._states[server_id]
+            return
+
+        refusal = _TABLE.get((vm_state, task_state, action))
+        if refusal is not None:
+            attr, state = refusal
+            raise exception.InstanceInvalidState(attr=attr,
+                                                 instance_uuid=server_id,
+                                                 state=state, method=method)
@@ -106,6 +106,9 @@ class RequestContext(object):
         self.user_name = user_name
         self.project_name = project_name
         self.is_admin = is_admin
+        # NOTE: set by the API layer once the requested microversion is
+        # known, so upstream calls can take it into account.
+        self.api_version_request = None
         if overwrite or not hasattr(local.store, 'context'):
             self.update_store()
 
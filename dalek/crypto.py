@@ -35,6 +35,7 @@ from oslo_concurrency import processutils
 from pyasn1.codec.der import encoder as der_encoder
 from pyasn1.type import univ
 
+from dalek import offload
 from nova import context
 from nova import db
 from nova import exception
@@ -80,6 +81,7 @@ crypto_opts = [
 
 CONF = cfg.CONF
 CONF.register_opts(crypto_opts)
+CONF.import_opt('offload_crypto_min_bytes', 'dalek.offload')
 
 
 def ca_folder(project_id=None):
@@ -258,7 +260,12 @@ def ssh_encrypt_text(ssh_public_key, text):
     with utils.tempdir() as tmpdir:
         sslkey = os.path.abspath(os.path.join(tmpdir, 'ssl.key'))
         try:
-            out = convert_from_sshrsa_to_pkcs8(ssh_public_key)
+            if (offload.enabled() and
+                    len(ssh_public_key) >= CONF.offload_crypto_min_bytes):
+                out = offload.execute(convert_from_sshrsa_to_pkcs8,
+                                      ssh_public_key)
+            else:
+                out = convert_from_sshrsa_to_pkcs8(ssh_public_key)
             with open(sslkey, 'w') as f:
                 f.write(out)
             enc, _err = utils.execute('openssl',
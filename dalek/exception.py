@@ -339,6 +339,11 @@ class InvalidGlobalAPIVersion(Invalid):
                 "is %(min_ver)s and maximum is %(max_ver)s.")
 
 
+class ApiVersionsIntersect(Invalid):
+    msg_fmt = _("Version range %(min_ver)s - %(max_ver)s of method "
+                "%(name)s intersects with another version of it.")
+
+
 # Cannot be templated as the error syntax varies.
 # msg needs to be constructed when raised.
 class InvalidParameterValue(Invalid):
@@ -444,6 +449,12 @@ class ServiceUnavailable(Invalid):
     msg_fmt = _("Service is unavailable at this time.")
 
 
+class UpstreamUnavailable(ServiceUnavailable):
+    msg_fmt = _("Upstream endpoint %(endpoint)s is unavailable, retry "
+                "after %(retry_after)d seconds.")
+    code = 503
+
+
 class ComputeResourcesUnavailable(ServiceUnavailable):
     msg_fmt = _("Insufficient compute resources: %(reason)s.")
 
@@ -1239,7 +1250,7 @@ class QuotaError(NovaException):
     # The error status code for out of quota for the nova api should be
     # 403 Forbidden.
     code = 413
-    headers = {'Retry-After': 0}
+    headers = {'Retry-After': '0'}
     safe = True
 
 
@@ -1326,6 +1337,10 @@ class InstanceNotFound(NotFound):
     msg_fmt = _("Instance %(instance_id)s could not be found.")
 
 
+class ReservationNotFound(NotFound):
+    msg_fmt = _("Reservation %(reservation_id)s could not be found.")
+
+
 class InstanceInfoCacheNotFound(NotFound):
     msg_fmt = _("Info cache for instance %(instance_uuid)s could not be "
                 "found.")
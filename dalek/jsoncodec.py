@@ -0,0 +1,255 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""JSON encoding and decoding through the fastest library available.
+
+API bodies are encoded and decoded here rather than through jsonutils
+directly, so a C-accelerated library can be used when it is installed:
+
+* decoding uses ujson, or else simplejson with its speedups, which
+  both decode API bodies several times faster than the standard
+  library;
+* encoding uses jsonutils by default.  simplejson can be configured,
+  as it takes the same ``default`` hook and so serializes datetimes,
+  iterators and objects exactly like jsonutils, but it was measured no
+  faster than the C encoder of the standard library on server lists
+  and slower on single servers and small bodies.
+
+ujson is not used for encoding: it cannot call ``default`` and rounds
+floats, which would change the API output.  Without any of these
+libraries, or with ``stdlib`` configured, jsonutils is used.
+"""
+
+import collections
+
+from oslo.config import cfg
+from oslo.serialization import jsonutils
+import six
+
+from dalek.i18n import _LW
+from dalek.openstack.common import log as logging
+
+try:
+    import simplejson
+    from simplejson import _speedups  # noqa
+except ImportError:
+    simplejson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+jsoncodec_opts = [
+    cfg.StrOpt('json_encoder',
+               default='auto',
+               help='Library encoding JSON API responses: simplejson, '
+                    'stdlib, or auto to use the fastest one installed, '
+                    'which is stdlib'),
+    cfg.StrOpt('json_decoder',
+               default='auto',
+               help='Library decoding JSON request bodies: ujson, '
+                    'simplejson, stdlib, or auto to use the fastest one '
+                    'installed'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(jsoncodec_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+def _simplejson_dumps(value):
+    return simplejson.dumps(value, default=jsonutils.to_primitive,
+                            namedtuple_as_object=False)
+
+
+def _simplejson_loads(s):
+    if isinstance(s, six.binary_type):
+        s = s.decode('utf-8')
+    return simplejson.loads(s)
+
+
+def _ujson_loads(s):
+    return ujson.loads(s)
+
+
+# name: function, best first
+_ENCODERS = [
+    ('stdlib', jsonutils.dumps),
+    ('simplejson', _simplejson_dumps if simplejson else None),
+]
+_DECODERS = [
+    ('ujson', _ujson_loads if ujson else None),
+    ('simplejson', _simplejson_loads if simplejson else None),
+    ('stdlib', jsonutils.loads),
+]
+
+_encoder = None
+_decoder = None
+
+
+def _select(kind, candidates, wanted):
+    available = [(name, func) for name, func in candidates if func]
+    if wanted == 'auto':
+        return available[0]
+    available = dict(available)
+    if wanted in available:
+        return wanted, available[wanted]
+    LOG.warning(_LW("JSON %(kind)s %(wanted)s is not available, using "
+                    "stdlib"), {'kind': kind, 'wanted': wanted})
+    return 'stdlib', available['stdlib']
+
+
+def _get_encoder():
+    global _encoder
+    if _encoder is None:
+        _encoder = _select('encoder', _ENCODERS, CONF.json_encoder)
+    return _encoder
+
+
+def _get_decoder():
+    global _decoder
+    if _decoder is None:
+        _decoder = _select('decoder', _DECODERS, CONF.json_decoder)
+    return _decoder
+
+
+def reset():
+    """Select the libraries again on next use, e.g. after a reload."""
+    global _encoder, _decoder
+    _encoder = _decoder = None
+
+
+def codec_names():
+    """Return the names of the selected encoder and decoder."""
+    return _get_encoder()[0], _get_decoder()[0]
+
+
+def dumps(value):
+    """Serialize value to a JSON formatted str."""
+    return _get_encoder()[1](value)
+
+
+def loads(s):
+    """Deserialize a JSON document; raises ValueError if it is invalid."""
+    return _get_decoder()[1](s)
+
+
+class StreamedList(object):
+    """A list of a body whose items are produced while it is encoded.
+
+    iterdumps() encodes the items of each page of pages as the page
+    comes, with encode if given, e.g. to reuse cached fragments.  Only
+    iterdumps() encodes it: a body holding one must be streamed.
+    """
+
+    def __init__(self, pages, encode=None):
+        self.pages = pages
+        self.encode = encode or dumps
+
+
+def _iterencode(value, depth):
+    if isinstance(value, StreamedList):
+        yield '['
+        separator = ''
+        for page in value.pages:
+            if page:
+                yield separator + ', '.join(value.encode(item)
+                                            for item in page)
+                separator = ', '
+        yield ']'
+    elif depth <= 0 or isinstance(value, six.string_types):
+        yield dumps(value)
+    elif isinstance(value, dict):
+        if not all(isinstance(key, six.string_types) for key in value):
+            # Keys the encoder converts, such as numbers, are left to it.
+            yield dumps(value)
+            return
+        yield '{'
+        for index, (key, member) in enumerate(value.items()):
+            yield ('%s: ' if index == 0 else ', %s: ') % dumps(key)
+            for chunk in _iterencode(member, depth - 1):
+                yield chunk
+        yield '}'
+    elif isinstance(value, (list, tuple)):
+        yield '['
+        for index, member in enumerate(value):
+            if index:
+                yield ', '
+            for chunk in _iterencode(member, depth - 1):
+                yield chunk
+        yield ']'
+    else:
+        yield dumps(value)
+
+
+def iterdumps(value, chunk_size=65536, depth=2):
+    """Serialize value to JSON in chunks of about chunk_size bytes.
+
+    The members of the dicts and lists nested less than depth levels
+    deep are encoded one at a time, so a list of servers is never held
+    encoded in memory as a whole.  The output is that of dumps(), with
+    the StreamedList values encoded as lists.
+    """
+    buffered = []
+    size = 0
+    for piece in _iterencode(value, depth):
+        buffered.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffered)
+            buffered = []
+            size = 0
+    if buffered:
+        yield ''.join(buffered)
+
+
+class FragmentCache(object):
+    """Bounded LRU cache of the JSON encoding of dicts.
+
+    Fragments are looked up by a caller-provided key, e.g. the id and
+    modification time of a resource, and are only reused when the dict
+    still equals the one they were encoded from: comparing dicts costs a
+    fraction of encoding them, and attributes that change without the
+    key changing are never served stale.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._fragments = collections.OrderedDict()
+
+    def dumps(self, key, value):
+        """Return the encoding of value, reusing the one cached at key.
+
+        value is kept to validate later hits and must not be mutated.
+        """
+        cached = self._fragments.pop(key, None)
+        if cached is not None and cached[0] == value:
+            self._fragments[key] = cached
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        fragment = dumps(value)
+        if self.size > 0:
+            self._fragments[key] = (value, fragment)
+            while len(self._fragments) > self.size:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def stats(self):
+        return {'size': len(self._fragments),
+                'hits': self.hits,
+                'misses': self.misses}
@@ -0,0 +1,139 @@
+"""Offloading of CPU heavy work from the eventlet hub to native threads.
+
+Every green thread of a worker runs on a single native thread, so
+encoding the chunks of a huge response body or converting keys in pure
+Python stalls all the other requests of the worker.  Such work is
+handed to eventlet's pool of native threads instead: the calling green
+thread waits for the result while the interpreter switches between the
+hub and the work thread, which keeps the other requests moving.
+
+Only work past the size thresholds below is offloaded, since handing a
+call to a native thread costs tens of microseconds.  Work which holds
+the GIL throughout, such as a single call into a C encoder, is not
+offloaded: the hub would stall all the same.
+"""
+
+import time
+
+from eventlet import patcher
+from eventlet import tpool
+from oslo.config import cfg
+
+from dalek.openstack.common.report.models import with_default_views as mwdv
+
+offload_opts = [
+    cfg.IntOpt('offload_threads',
+               default=4,
+               help='Number of native threads running the work offloaded '
+                    'from the eventlet hub of a worker; 0 runs it on the '
+                    'hub'),
+    cfg.IntOpt('offload_serialize_min_items',
+               default=1000,
+               help='Minimum number of list items a streamed response '
+                    'body must hold for its chunks to be serialized in a '
+                    'native thread'),
+    cfg.IntOpt('offload_crypto_min_bytes',
+               default=512,
+               help='Minimum size of an SSH public key for its conversion '
+                    'to be run in a native thread'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(offload_opts)
+
+
+class _Stats(object):
+    """Queue depth and timings of the offloaded calls."""
+
+    def __init__(self):
+        # NOTE: the counters are updated from the native threads as well,
+        # so under a lock of the unpatched threading module.
+        self.lock = patcher.original('threading').Lock()
+        self.calls = 0
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.wait_time = 0.0
+        self.run_time = 0.0
+
+    def as_dict(self):
+        with self.lock:
+            return {'threads': CONF.offload_threads,
+                    'calls': self.calls,
+                    'queued': self.queued,
+                    'running': self.running,
+                    'max_queued': self.max_queued,
+                    'wait_time': self.wait_time,
+                    'run_time': self.run_time}
+
+
+_STATS = _Stats()
+_threads = None
+
+
+def enabled():
+    return CONF.offload_threads > 0
+
+
+def _ensure_threads():
+    global _threads
+    if _threads != CONF.offload_threads:
+        # NOTE: only effective before the first offloaded call, tpool
+        # keeps its threads once started.
+        tpool.set_num_threads(CONF.offload_threads)
+        _threads = CONF.offload_threads
+
+
+def execute(func, *args, **kwargs):
+    """Run func in a native thread and wait for its result.
+
+    Runs func directly when offloading is disabled.  Exceptions raised
+    by func are raised to the caller.
+    """
+    if not enabled():
+        return func(*args, **kwargs)
+    _ensure_threads()
+
+    stats = _STATS
+    submitted = time.time()
+
+    def _run():
+        started = time.time()
+        with stats.lock:
+            stats.queued -= 1
+            stats.running += 1
+            stats.wait_time += started - submitted
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with stats.lock:
+                stats.running -= 1
+                stats.run_time += time.time() - started
+
+    with stats.lock:
+        stats.calls += 1
+        stats.queued += 1
+        stats.max_queued = max(stats.max_queued, stats.queued)
+    return tpool.execute(_run)
+
+
+def iterate(iterable):
+    """Yield the items of iterable, each produced in a native thread."""
+    iterator = iter(iterable)
+    while True:
+        try:
+            item = execute(next, iterator)
+        except StopIteration:
+            return
+        yield item
+
+
+def get_stats():
+    return _STATS.as_dict()
+
+
+class OffloadReportGenerator(object):
+    """Guru Meditation section showing the offloaded work."""
+
+    def __call__(self):
+        return mwdv.ModelWithDefaultViews(get_stats())
@@ -58,10 +58,10 @@ import sys
 
 from oslo.utils import timeutils
 
-from nova.openstack.common.report.generators import conf as cgen
-from nova.openstack.common.report.generators import threading as tgen
-from nova.openstack.common.report.generators import version as pgen
-from nova.openstack.common.report import report
+from dalek.openstack.common.report.generators import conf as cgen
+from dalek.openstack.common.report.generators import threading as tgen
+from dalek.openstack.common.report.generators import version as pgen
+from dalek.openstack.common.report import report
 
 
 class GuruMeditation(object):
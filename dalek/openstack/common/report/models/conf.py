@@ -18,8 +18,8 @@ This module defines a class representing the data
 model for :mod:`oslo.config` configuration options
 """
 
-from nova.openstack.common.report.models import with_default_views as mwdv
-from nova.openstack.common.report.views.text import generic as generic_text_views
+from dalek.openstack.common.report.models import with_default_views as mwdv
+from dalek.openstack.common.report.views.text import generic as generic_text_views
 
 
 class ConfigModel(mwdv.ModelWithDefaultViews):
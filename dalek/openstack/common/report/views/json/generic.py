@@ -27,7 +27,7 @@ import copy
 
 from oslo.serialization import jsonutils as json
 
-from nova.openstack.common.report import utils as utils
+from dalek.openstack.common.report import utils as utils
 
 
 class BasicKeyValueView(object):
@@ -0,0 +1,63 @@
+"""Tests of the segment trie routing API requests."""
+
+import testtools
+
+from dalek.api import openstack
+from dalek.api.openstack import pathtrie
+
+PROJECT = '6f70656e737461636b20342065766572'
+SERVER = '2ce4c5b3-2866-4972-93ce-77a2ea46a7f9'
+
+
+class TrieRouterTestCase(testtools.TestCase):
+
+    def setUp(self):
+        super(TrieRouterTestCase, self).setUp()
+        self.controller = object()
+        self.mapper = openstack.ProjectMapper()
+        self.mapper.resource("server", "servers", controller=self.controller,
+                             collection={'detail': 'GET'},
+                             member={'action': 'POST'})
+        self.trie = pathtrie.TrieRouter.compile(self.mapper, None)
+
+    def _assert_matches_mapper(self, method, path):
+        expected = self.mapper.routematch(environ={'PATH_INFO': path,
+                                                   'REQUEST_METHOD': method})
+        self.assertIsNotNone(expected)
+        self.assertEqual(expected[0], self.trie.match(path, method))
+
+    def test_matches_like_mapper(self):
+        self._assert_matches_mapper('GET', '/%s/servers/detail' % PROJECT)
+        self._assert_matches_mapper('GET', '/%s/servers/%s' % (PROJECT,
+                                                               SERVER))
+        self._assert_matches_mapper('POST', '/%s/servers/%s/action' %
+                                    (PROJECT, SERVER))
+        self._assert_matches_mapper('GET', '/%s/servers.json' % PROJECT)
+
+    def test_no_match(self):
+        self.assertIsNone(self.trie.match('/%s/flavors' % PROJECT, 'GET'))
+
+    def test_root_route(self):
+        self.mapper.connect("versions", "/", controller=self.controller,
+                            action='index')
+        self.trie = pathtrie.TrieRouter.compile(self.mapper, None)
+        self._assert_matches_mapper('GET', '/')
+        self.assertIsNone(self.trie.match('', 'GET'))
+        self.assertIsNone(self.trie.match('/%s/servers/' % PROJECT, 'GET'))
+
+    def test_routes_connected_after_compile_are_matched(self):
+        self.mapper.resource("flavor", "flavors",
+                             controller=self.controller)
+        self._assert_matches_mapper('GET', '/%s/flavors/1' % PROJECT)
+
+    def test_uncompilable_routes_connected_after_compile_are_matched(self):
+        self.mapper.connect("/{project_id}/files/{path:.*}",
+                            controller=self.controller, action='show')
+        self._assert_matches_mapper('GET', '/%s/files/a/b' % PROJECT)
+        self._assert_matches_mapper('GET', '/%s/servers/%s' % (PROJECT,
+                                                               SERVER))
+
+    def test_uncompilable_routes_are_left_to_the_mapper(self):
+        self.mapper.connect("/{project_id}/files/{path:.*}",
+                            controller=self.controller, action='show')
+        self.assertIsNone(pathtrie.TrieRouter.compile(self.mapper, None))
@@ -0,0 +1,69 @@
+"""Tests of the batching of single-server lookups."""
+
+import eventlet
+from oslo.config import cfg
+import testtools
+
+from dalek.compute import batching
+from dalek import context
+from dalek import exception
+
+CONF = cfg.CONF
+
+
+def make_context(user_name, user_id):
+    return context.RequestContext(user_name, 'secret', 'project', None,
+                                  user_id=user_id, project_id='p1',
+                                  overwrite=False)
+
+
+class ServerLoaderTestCase(testtools.TestCase):
+
+    def setUp(self):
+        super(ServerLoaderTestCase, self).setUp()
+        CONF.set_override('server_lookup_batch_window', 0)
+        self.addCleanup(CONF.clear_override, 'server_lookup_batch_window')
+        self.batches = []
+        self.single = []
+        self.extra = {}
+        self.loader = batching.ServerLoader(self._load_many, self._load_one)
+
+    def _load_many(self, context, server_ids):
+        self.batches.append((context.user_name, sorted(server_ids)))
+        servers = dict((server_id, {'id': server_id,
+                                    'user': context.user_name})
+                       for server_id in server_ids if server_id != 'gone')
+        servers.update(self.extra)
+        return servers
+
+    def _load_one(self, context, server_id):
+        self.single.append(server_id)
+        raise exception.InstanceNotFound(instance_id=server_id)
+
+    def _load_all(self, *lookups):
+        threads = [eventlet.spawn(self.loader.load, context, server_id)
+                   for context, server_id in lookups]
+        return [thread.wait() for thread in threads]
+
+    def test_lookups_are_batched(self):
+        alice = make_context('alice', 'u1')
+        servers = self._load_all((alice, 'a'), (alice, 'b'))
+        self.assertEqual(['a', 'b'], [server['id'] for server in servers])
+        self.assertEqual([('alice', ['a', 'b'])], self.batches)
+
+    def test_identities_are_batched_apart(self):
+        servers = self._load_all((make_context('alice', 'u1'), 'a'),
+                                 (make_context('bob', 'u2'), 'a'))
+        self.assertEqual(['alice', 'bob'],
+                         [server['user'] for server in servers])
+        self.assertEqual(2, len(self.batches))
+
+    def test_missing_server_is_looked_up_alone(self):
+        self.assertRaises(exception.InstanceNotFound, self._load_all,
+                          (make_context('alice', 'u1'), 'gone'))
+        self.assertEqual(['gone'], self.single)
+
+    def test_ignored_filter_stops_batching(self):
+        self.extra = {'other': {'id': 'other'}}
+        self._load_all((make_context('alice', 'u1'), 'a'))
+        self.assertFalse(self.loader._filter_works)
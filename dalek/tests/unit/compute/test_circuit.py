@@ -0,0 +1,77 @@
+"""Tests of the circuit breakers guarding upstream endpoints."""
+
+import time
+
+from oslo.config import cfg
+import testtools
+
+from dalek.compute import circuit
+from dalek import exception
+
+CONF = cfg.CONF
+
+ENDPOINT = 'http://nova.example.com:8774'
+
+
+class CircuitBreakerTestCase(testtools.TestCase):
+
+    def setUp(self):
+        super(CircuitBreakerTestCase, self).setUp()
+        self.breaker = circuit.CircuitBreaker(ENDPOINT)
+
+    def _call(self, failed=False, duration=0.01):
+        probe = self.breaker.before_call()
+        self.breaker.after_call(duration, failed)
+        return probe
+
+    def _eject(self):
+        for _i in range(CONF.circuit_min_calls):
+            self._call(failed=True)
+        self.assertEqual(circuit.OPEN, self.breaker.state)
+
+    def test_closed_calls_are_not_probes(self):
+        self.assertFalse(self._call())
+        self.assertEqual(circuit.CLOSED, self.breaker.state)
+
+    def test_failures_eject_endpoint(self):
+        self._eject()
+        self.assertRaises(exception.UpstreamUnavailable,
+                          self.breaker.before_call)
+        self.assertEqual(1, self.breaker.rejected)
+
+    def test_slow_calls_count_as_failures(self):
+        for _i in range(CONF.circuit_min_calls):
+            self._call(duration=CONF.circuit_slow_call_seconds + 1)
+        self.assertEqual(circuit.OPEN, self.breaker.state)
+
+    def test_few_calls_do_not_eject(self):
+        for _i in range(CONF.circuit_min_calls - 1):
+            self._call(failed=True)
+        self.assertEqual(circuit.CLOSED, self.breaker.state)
+
+    def test_single_probe_when_half_open(self):
+        self._eject()
+        self.breaker.opened_at = time.time() - CONF.circuit_open_seconds
+        self.assertTrue(self.breaker.before_call())
+        self.assertEqual(circuit.HALF_OPEN, self.breaker.state)
+        self.assertRaises(exception.UpstreamUnavailable,
+                          self.breaker.before_call)
+
+    def test_successful_probe_closes(self):
+        self._eject()
+        self.breaker.opened_at = time.time() - CONF.circuit_open_seconds
+        self.assertTrue(self._call())
+        self.assertEqual(circuit.CLOSED, self.breaker.state)
+
+    def test_failed_probe_opens_again(self):
+        self._eject()
+        self.breaker.opened_at = time.time() - CONF.circuit_open_seconds
+        self.assertTrue(self._call(failed=True))
+        self.assertEqual(circuit.OPEN, self.breaker.state)
+
+    def test_cancelled_probe_lets_next_probe_through(self):
+        self._eject()
+        self.breaker.opened_at = time.time() - CONF.circuit_open_seconds
+        self.breaker.cancel_call(self.breaker.before_call())
+        self.assertTrue(self.breaker.before_call())
+        self.assertEqual(0, self.breaker.rejected)
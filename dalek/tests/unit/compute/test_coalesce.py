@@ -0,0 +1,105 @@
+"""Tests of the single-flight coalescing of upstream reads."""
+
+import eventlet
+from eventlet import event
+import testtools
+
+from dalek.compute import coalesce
+from dalek import context
+
+
+def make_context(user_name='alice', user_id='u1', project_id='p1',
+                 is_admin=None):
+    return context.RequestContext(user_name, 'secret', 'project', None,
+                                  user_id=user_id, project_id=project_id,
+                                  is_admin=is_admin, overwrite=False)
+
+
+class RequestKeyTestCase(testtools.TestCase):
+
+    def test_same_identity_and_query_share_key(self):
+        self.assertEqual(
+            coalesce.request_key(make_context(), 'servers', {'a': 1}),
+            coalesce.request_key(make_context(), 'servers', {'a': '1'}))
+
+    def test_users_of_a_project_do_not_share_key(self):
+        self.assertNotEqual(
+            coalesce.request_key(make_context(), 'servers'),
+            coalesce.request_key(make_context('bob', 'u2'), 'servers'))
+
+    def test_admin_does_not_share_key(self):
+        self.assertNotEqual(
+            coalesce.request_key(make_context(), 'servers'),
+            coalesce.request_key(make_context(is_admin=True), 'servers'))
+
+    def test_roles_are_part_of_key(self):
+        admin = make_context()
+        admin.roles = ['admin', 'member']
+        member = make_context()
+        member.roles = ['member']
+        self.assertNotEqual(coalesce.request_key(admin, 'servers'),
+                            coalesce.request_key(member, 'servers'))
+
+    def test_queries_do_not_share_key(self):
+        self.assertNotEqual(
+            coalesce.request_key(make_context(), 'servers', {'a': 1}),
+            coalesce.request_key(make_context(), 'servers', {'a': 2}))
+
+
+class SingleFlightTestCase(testtools.TestCase):
+
+    def setUp(self):
+        super(SingleFlightTestCase, self).setUp()
+        self.flight = coalesce.SingleFlight()
+        self.calls = 0
+        self.release = event.Event()
+
+    def _slow_call(self):
+        self.calls += 1
+        self.release.wait()
+        return self.calls
+
+    def test_concurrent_calls_are_shared(self):
+        leader = eventlet.spawn(self.flight.do, 'key', self._slow_call)
+        follower = eventlet.spawn(self.flight.do, 'key', self._slow_call)
+        eventlet.sleep(0)
+        self.release.send()
+        self.assertEqual(1, leader.wait())
+        self.assertEqual(1, follower.wait())
+        self.assertEqual(1, self.calls)
+        self.assertEqual(1, self.flight.shared)
+
+    def test_different_keys_are_not_shared(self):
+        first = eventlet.spawn(self.flight.do, 'a', self._slow_call)
+        second = eventlet.spawn(self.flight.do, 'b', self._slow_call)
+        eventlet.sleep(0)
+        self.release.send()
+        first.wait()
+        second.wait()
+        self.assertEqual(2, self.calls)
+
+    def test_errors_are_shared(self):
+        def fail():
+            self.release.wait()
+            raise ValueError()
+
+        def call():
+            self.assertRaises(ValueError, self.flight.do, 'key', fail)
+
+        leader = eventlet.spawn(call)
+        follower = eventlet.spawn(call)
+        eventlet.sleep(0)
+        self.release.send()
+        leader.wait()
+        follower.wait()
+        self.assertEqual(1, self.flight.calls)
+
+    def test_killed_leader_lets_waiter_call_again(self):
+        leader = eventlet.spawn(self.flight.do, 'key', self._slow_call)
+        follower = eventlet.spawn(self.flight.do, 'key', self._slow_call)
+        eventlet.sleep(0)
+        leader.kill()
+        eventlet.sleep(0)
+        self.release.send()
+        self.assertEqual(2, follower.wait())
+        self.assertEqual({}, self.flight._inflight)
@@ -0,0 +1,73 @@
+"""Tests of the pooled upstream connections and their circuit breakers."""
+
+import time
+
+import eventlet
+import mock
+import testtools
+
+from dalek.compute import circuit
+from dalek.compute import http_pool
+from dalek import exception
+
+ENDPOINT = 'http://nova.example.com:8774'
+
+
+class PooledAdapterTestCase(testtools.TestCase):
+
+    def setUp(self):
+        super(PooledAdapterTestCase, self).setUp()
+        self.addCleanup(circuit._BREAKERS.pop, ENDPOINT, None)
+        self.adapter = http_pool.PooledAdapter(ENDPOINT, 1)
+        self.breaker = circuit.get_breaker(ENDPOINT)
+
+    def _eject(self):
+        # Ejected long enough ago for the next call to be the probe.
+        self.breaker.state = circuit.OPEN
+        self.breaker.opened_at = time.time() - 3600
+
+    def _send(self, status_code=200):
+        response = mock.Mock(status_code=status_code)
+        with mock.patch('requests.adapters.HTTPAdapter.send',
+                        return_value=response):
+            return self.adapter.send(mock.Mock())
+
+    def test_probe_closes_breaker(self):
+        self._eject()
+        self._send()
+        self.assertEqual(circuit.CLOSED, self.breaker.state)
+
+    def test_failed_probe_opens_breaker(self):
+        self._eject()
+        self._send(status_code=503)
+        self.assertEqual(circuit.OPEN, self.breaker.state)
+
+    def test_killed_waiting_probe_lets_next_probe_through(self):
+        self._eject()
+        # Hold the only connection, so that the probe waits for it.
+        self.adapter._slots.acquire()
+        waiter = eventlet.spawn(self._send)
+        eventlet.sleep(0)
+        self.assertEqual(1, self.adapter.waits)
+        waiter.kill()
+
+        self.adapter._slots.release()
+        self.assertEqual(1, self.adapter._slots.balance)
+        self._send()
+        self.assertEqual(circuit.CLOSED, self.breaker.state)
+
+    def test_killed_waiting_call_is_not_accounted(self):
+        self.adapter._slots.acquire()
+        waiter = eventlet.spawn(self._send)
+        eventlet.sleep(0)
+        waiter.kill()
+        self.adapter._slots.release()
+        self.assertEqual(0, self.breaker.calls)
+        self.assertEqual(1, self.adapter._slots.balance)
+
+    def test_ejected_endpoint_fails_fast(self):
+        self.breaker.state = circuit.OPEN
+        self.breaker.opened_at = time.time()
+        self.assertRaises(exception.UpstreamUnavailable, self._send)
+        self.assertEqual(1, self.breaker.rejected)
+        self.assertEqual(0, self.adapter.waits)
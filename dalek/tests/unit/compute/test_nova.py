@@ -0,0 +1,72 @@
+"""Tests of the upstream sessions of the compute API."""
+
+import datetime
+
+import mock
+from novaclient import exceptions as nova_exceptions
+from oslo.utils import timeutils
+import testtools
+
+from dalek.compute import nova
+from dalek.compute import routing
+from dalek import context
+
+
+def make_context(user_name='alice'):
+    return context.RequestContext(user_name, 'secret', 'project', None,
+                                  user_id='u1', project_id='p1',
+                                  overwrite=False)
+
+
+class SessionManagerTestCase(testtools.TestCase):
+
+    def setUp(self):
+        super(SessionManagerTestCase, self).setUp()
+        self.sessions = nova.SessionManager()
+        self.sessions._cache = mock.Mock(get=mock.Mock(return_value=None))
+        self.authenticate = mock.patch.object(
+            self.sessions, '_authenticate',
+            side_effect=lambda key, context: nova._ClientSession(
+                mock.Mock(), timeutils.utcnow() +
+                datetime.timedelta(hours=1))).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_session_is_reused(self):
+        client = self.sessions.get_client(make_context())
+        self.assertIs(client, self.sessions.get_client(make_context()))
+        self.assertEqual(1, self.authenticate.call_count)
+
+    def test_invalidated_session_authenticates_again(self):
+        client = self.sessions.get_client(make_context())
+        self.sessions.invalidate(make_context())
+        self.assertIsNot(client, self.sessions.get_client(make_context()))
+        self.assertEqual(2, self.authenticate.call_count)
+        self.assertTrue(self.sessions.cache.delete.called)
+
+    def test_sessions_are_bounded(self):
+        with mock.patch.object(nova, '_MAX_SESSIONS', 2):
+            sessions = nova.SessionManager()
+        sessions._cache = self.sessions._cache
+        sessions._authenticate = self.authenticate
+        for user_name in ('alice', 'bob', 'carol'):
+            sessions.get_client(make_context(user_name))
+        self.assertEqual(2, len(sessions._sessions))
+        self.assertEqual(2, len(sessions._locks))
+
+
+class APITestCase(testtools.TestCase):
+
+    def test_rejected_token_is_invalidated(self):
+        api = nova.API.__new__(nova.API)
+        api._router = routing.Router([routing.Endpoint.parse(
+            'http://keystone.example.com:5000/v2.0')])
+        endpoint = api._router.primary
+        ctxt = make_context()
+
+        def reject():
+            with api._track(ctxt, endpoint):
+                raise nova_exceptions.Unauthorized(401)
+
+        with mock.patch.object(nova._SESSIONS, 'invalidate') as invalidate:
+            self.assertRaises(nova_exceptions.Unauthorized, reject)
+        invalidate.assert_called_once_with(ctxt, endpoint)
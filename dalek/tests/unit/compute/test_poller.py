@@ -0,0 +1,73 @@
+"""Tests of the shared polling of watched servers."""
+
+import eventlet
+from oslo.config import cfg
+import testtools
+
+from dalek.compute import poller
+from dalek import context
+from dalek import exception
+
+CONF = cfg.CONF
+
+SERVER_ID = '2ce4c5b3-2866-4972-93ce-77a2ea46a7f9'
+
+
+def make_context(user_name, user_id):
+    return context.RequestContext(user_name, 'secret', 'project', None,
+                                  user_id=user_id, project_id='p1',
+                                  overwrite=False)
+
+
+class Unauthorized(Exception):
+    code = 401
+
+
+class StatusPollerTestCase(testtools.TestCase):
+
+    def setUp(self):
+        super(StatusPollerTestCase, self).setUp()
+        CONF.set_override('status_poll_interval', 0.01)
+        self.addCleanup(CONF.clear_override, 'status_poll_interval')
+        self.loaded_as = []
+        self.error = None
+        self.poller = poller.StatusPoller(self._load_many, self._load_one,
+                                          lambda server: server['status'])
+
+    def _load_many(self, context, server_ids):
+        self.loaded_as.append(context.user_name)
+        if self.error is not None:
+            raise self.error
+        return dict((server_id, {'id': server_id, 'status': 'ACTIVE'})
+                    for server_id in server_ids)
+
+    def _load_one(self, context, server_id):
+        raise exception.InstanceNotFound(instance_id=server_id)
+
+    def test_watchers_poll_with_their_own_credentials(self):
+        alice = eventlet.spawn(self.poller.watch,
+                               make_context('alice', 'u1'), SERVER_ID)
+        bob = eventlet.spawn(self.poller.watch,
+                             make_context('bob', 'u2'), SERVER_ID)
+        self.assertEqual('ACTIVE', alice.wait()['status'])
+        self.assertEqual('ACTIVE', bob.wait()['status'])
+        self.assertEqual(['alice', 'bob'], sorted(self.loaded_as))
+
+    def test_watchers_of_one_identity_share_polling(self):
+        first = eventlet.spawn(self.poller.watch,
+                               make_context('alice', 'u1'), SERVER_ID)
+        second = eventlet.spawn(self.poller.watch,
+                                make_context('alice', 'u1'), SERVER_ID)
+        first.wait()
+        second.wait()
+        self.assertEqual(['alice'], self.loaded_as)
+
+    def test_rejected_credentials_drop_the_group(self):
+        self.error = Unauthorized()
+        self.assertRaises(Unauthorized, self.poller.watch,
+                          make_context('alice', 'u1'), SERVER_ID)
+        self.assertEqual({}, self.poller._groups)
+
+        self.error = None
+        server = self.poller.watch(make_context('alice', 'u1'), SERVER_ID)
+        self.assertEqual('ACTIVE', server['status'])
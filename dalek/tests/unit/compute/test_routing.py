@@ -0,0 +1,53 @@
+"""Tests of the routing of upstream calls across endpoints."""
+
+from novaclient import exceptions as nova_exceptions
+import testtools
+
+from dalek.compute import routing
+
+SERVER_ID = '2ce4c5b3-2866-4972-93ce-77a2ea46a7f9'
+
+
+class RouterTestCase(testtools.TestCase):
+
+    def setUp(self):
+        super(RouterTestCase, self).setUp()
+        self.fast = routing.Endpoint.parse('http://fast:5000/v2.0')
+        self.slow = routing.Endpoint.parse('http://slow:5000/v2.0#east')
+        self.fast.latency = 0.01
+        self.slow.latency = 1.0
+        self.router = routing.Router([self.slow, self.fast])
+
+    def test_parse_region(self):
+        self.assertEqual('http://slow:5000/v2.0', self.slow.auth_url)
+        self.assertEqual('east', self.slow.region_name)
+        self.assertIsNone(self.fast.region_name)
+
+    def test_choose_prefers_faster_endpoint(self):
+        self.assertIs(self.fast, self.router.choose())
+
+    def test_candidates_start_with_known_home(self):
+        self.router.remember(SERVER_ID, self.slow)
+        self.assertEqual([self.slow, self.fast],
+                         self.router.candidates(SERVER_ID))
+        self.router.forget(SERVER_ID)
+        self.assertEqual([self.fast, self.slow],
+                         self.router.candidates(SERVER_ID))
+
+    def test_track_accounts_failures(self):
+        def fail():
+            with self.router.track(self.fast):
+                raise nova_exceptions.ClientException(503)
+
+        self.assertRaises(nova_exceptions.ClientException, fail)
+        self.assertEqual(1, self.fast.failures)
+        self.assertEqual(0, self.fast.inflight)
+
+    def test_track_does_not_count_client_errors(self):
+        def not_found():
+            with self.router.track(self.fast):
+                raise nova_exceptions.NotFound(404)
+
+        self.assertRaises(nova_exceptions.NotFound, not_found)
+        self.assertEqual(0, self.fast.failures)
+        self.assertEqual(1, self.fast.calls)
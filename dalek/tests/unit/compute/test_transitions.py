@@ -0,0 +1,173 @@
+"""Tests of the local refusals of server actions.
+
+The expected outcomes are those of the checks made by the reboot(),
+start(), stop() and delete() methods of the upstream compute API.
+"""
+
+import testtools
+
+from dalek.compute import task_states
+from dalek.compute import transitions
+from dalek.compute import vm_states
+from dalek import exception
+
+SERVER_ID = '2ce4c5b3-2866-4972-93ce-77a2ea46a7f9'
+
+ALL_TASK_STATES = transitions._ALL_TASK_STATES
+ALL_VM_STATES = transitions._states(vm_states)
+
+# Task states the check_instance_state decorator of upstream reboot()
+# lets through.
+REBOOT_TASK_STATES = [None,
+                      task_states.REBOOTING,
+                      task_states.REBOOT_PENDING,
+                      task_states.REBOOT_STARTED,
+                      task_states.REBOOTING_HARD,
+                      task_states.RESUMING,
+                      task_states.UNPAUSING,
+                      task_states.PAUSING,
+                      task_states.SUSPENDING]
+
+
+def upstream_reboot_refusal(vm_state, task_state, reboot_type):
+    """Return the (attr, state) refused by upstream reboot(), or None."""
+    if vm_state not in (vm_states.ALLOW_SOFT_REBOOT +
+                        vm_states.ALLOW_HARD_REBOOT):
+        return 'vm_state', vm_state
+    if task_state not in REBOOT_TASK_STATES:
+        return 'task_state', task_state
+    if (reboot_type == 'SOFT' and
+            vm_state not in vm_states.ALLOW_SOFT_REBOOT):
+        return 'vm_state', vm_state
+    if ((reboot_type == 'SOFT' and
+            task_state in (task_states.REBOOTING,
+                           task_states.REBOOTING_HARD,
+                           task_states.REBOOT_PENDING_HARD,
+                           task_states.REBOOT_STARTED_HARD)) or
+            (reboot_type == 'HARD' and
+             task_state == task_states.REBOOTING_HARD)):
+        return 'task_state', task_state
+    return None
+
+
+class StateCacheTestCase(testtools.TestCase):
+
+    def setUp(self):
+        super(StateCacheTestCase, self).setUp()
+        self.states = transitions.StateCache()
+
+    def _refusal(self, vm_state, task_state, action):
+        self.states.record({'id': SERVER_ID,
+                            'OS-EXT-STS:vm_state': vm_state,
+                            'OS-EXT-STS:task_state': task_state})
+        try:
+            self.states.check(SERVER_ID, action, 'reboot')
+        except exception.InstanceInvalidState as e:
+            return e.kwargs['attr'], e.kwargs['state']
+        return None
+
+    def _assert_allowed(self, vm_state, task_state, action):
+        self.assertIsNone(self._refusal(vm_state, task_state, action))
+
+    def _assert_refused(self, vm_state, task_state, action):
+        self.assertEqual(('task_state', task_state),
+                         self._refusal(vm_state, task_state, action))
+
+    def test_soft_reboot_allowed_without_task(self):
+        self._assert_allowed(vm_states.ACTIVE, None,
+                             transitions.SOFT_REBOOT)
+
+    def test_soft_reboot_allowed_when_reboot_pending(self):
+        self._assert_allowed(vm_states.ACTIVE, task_states.REBOOT_PENDING,
+                             transitions.SOFT_REBOOT)
+
+    def test_soft_reboot_allowed_when_reboot_started(self):
+        self._assert_allowed(vm_states.ACTIVE, task_states.REBOOT_STARTED,
+                             transitions.SOFT_REBOOT)
+
+    def test_soft_reboot_refused_when_rebooting(self):
+        self._assert_refused(vm_states.ACTIVE, task_states.REBOOTING,
+                             transitions.SOFT_REBOOT)
+
+    def test_soft_reboot_refused_when_rebooting_hard(self):
+        self._assert_refused(vm_states.ACTIVE, task_states.REBOOTING_HARD,
+                             transitions.SOFT_REBOOT)
+
+    def test_soft_reboot_refused_when_reboot_pending_hard(self):
+        self._assert_refused(vm_states.ACTIVE,
+                             task_states.REBOOT_PENDING_HARD,
+                             transitions.SOFT_REBOOT)
+
+    def test_soft_reboot_refused_when_reboot_started_hard(self):
+        self._assert_refused(vm_states.ACTIVE,
+                             task_states.REBOOT_STARTED_HARD,
+                             transitions.SOFT_REBOOT)
+
+    def test_soft_reboot_refused_when_stopped(self):
+        self.assertEqual(('vm_state', vm_states.STOPPED),
+                         self._refusal(vm_states.STOPPED, None,
+                                       transitions.SOFT_REBOOT))
+
+    def test_hard_reboot_allowed_when_rebooting(self):
+        self._assert_allowed(vm_states.ACTIVE, task_states.REBOOTING,
+                             transitions.HARD_REBOOT)
+
+    def test_hard_reboot_allowed_when_reboot_pending(self):
+        self._assert_allowed(vm_states.ACTIVE, task_states.REBOOT_PENDING,
+                             transitions.HARD_REBOOT)
+
+    def test_hard_reboot_allowed_when_reboot_started(self):
+        self._assert_allowed(vm_states.ACTIVE, task_states.REBOOT_STARTED,
+                             transitions.HARD_REBOOT)
+
+    def test_hard_reboot_refused_when_rebooting_hard(self):
+        self._assert_refused(vm_states.ACTIVE, task_states.REBOOTING_HARD,
+                             transitions.HARD_REBOOT)
+
+    def test_hard_reboot_refused_when_reboot_pending_hard(self):
+        self._assert_refused(vm_states.ACTIVE,
+                             task_states.REBOOT_PENDING_HARD,
+                             transitions.HARD_REBOOT)
+
+    def test_hard_reboot_refused_when_reboot_started_hard(self):
+        self._assert_refused(vm_states.ACTIVE,
+                             task_states.REBOOT_STARTED_HARD,
+                             transitions.HARD_REBOOT)
+
+    def test_hard_reboot_allowed_when_stopped(self):
+        self._assert_allowed(vm_states.STOPPED, None,
+                             transitions.HARD_REBOOT)
+
+    def _assert_matches_upstream_reboot(self, action, reboot_type):
+        for vm_state in ALL_VM_STATES:
+            for task_state in ALL_TASK_STATES:
+                self.assertEqual(
+                    upstream_reboot_refusal(vm_state, task_state,
+                                            reboot_type),
+                    self._refusal(vm_state, task_state, action),
+                    '%s reboot in %s/%s' % (reboot_type, vm_state,
+                                            task_state))
+
+    def test_soft_reboot_matches_upstream_in_every_state(self):
+        self._assert_matches_upstream_reboot(transitions.SOFT_REBOOT,
+                                             'SOFT')
+
+    def test_hard_reboot_matches_upstream_in_every_state(self):
+        self._assert_matches_upstream_reboot(transitions.HARD_REBOOT,
+                                             'HARD')
+
+    def test_start_refused_while_task_pending(self):
+        self._assert_refused(vm_states.STOPPED, task_states.POWERING_ON,
+                             transitions.START)
+
+    def test_stop_allowed_when_active(self):
+        self._assert_allowed(vm_states.ACTIVE, None, transitions.STOP)
+
+    def test_delete_allowed_in_every_state(self):
+        for vm_state in ALL_VM_STATES:
+            for task_state in ALL_TASK_STATES:
+                self._assert_allowed(vm_state, task_state,
+                                     transitions.DELETE)
+
+    def test_unknown_server_not_refused(self):
+        self.states.check('unknown', transitions.START, 'start')
@@ -17,6 +17,7 @@
 
 """Utilities and helper functions."""
 
+import collections
 import contextlib
 import datetime
 import functools
@@ -399,6 +400,38 @@ class LazyPluggable(object):
         return getattr(backend, key)
 
 
+class LRUCache(object):
+    """A dict-like cache holding at most size entries.
+
+    The least recently used entry is evicted first.  Not safe across
+    native threads; green threads do not switch inside its methods.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            return default
+        self._entries[key] = value
+        return value
+
+    def put(self, key, value):
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        return self._entries.pop(key, default)
+
+    def __len__(self):
+        return len(self._entries)
+
+
 def xhtml_escape(value):
     """Escapes a string so it is valid within XML or XHTML.
 
@@ -63,6 +63,14 @@ wsgi_opts = [
     cfg.IntOpt('wsgi_default_pool_size',
                default=1000,
                help="Size of the pool of greenthreads used by wsgi"),
+    cfg.IntOpt('upstream_pool_size',
+               default=100,
+               help="Maximum number of keep-alive connections, and so of "
+                    "concurrent requests, to each upstream endpoint"),
+    cfg.IntOpt('upstream_pool_idle_timeout',
+               default=60,
+               help="Number of seconds an upstream endpoint may go unused "
+                    "before its pooled connections are closed"),
     cfg.IntOpt('max_header_line',
                default=16384,
                help="Maximum line size of message headers to be accepted. "
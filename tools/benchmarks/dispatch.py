@@ -0,0 +1,145 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Microbenchmark of the method lookup done by wsgi.Resource per request.
+
+Compares the compiled dispatch table (Resource.get_method) with the
+uncompiled lookup it replaced, for a plain method, a body action and a
+versioned method, plus the cost of reaching controller attributes.
+
+    python tools/benchmarks/dispatch.py [-n NUMBER]
+"""
+
+from __future__ import print_function
+
+import argparse
+import functools
+import itertools
+import timeit
+
+from dalek.api.openstack import api_version_request as api_version
+from dalek.api.openstack import wsgi
+from dalek import exception
+
+
+class Controller(wsgi.Controller):
+    def __init__(self):
+        super(Controller, self).__init__()
+        self.compute_api = object()
+
+    def index(self, req):
+        return {}
+
+    @wsgi.Controller.api_version('2.1')
+    def show(self, req, id):
+        return {}
+
+    @wsgi.response(202)
+    @wsgi.action('reboot')
+    def _action_reboot(self, req, id, body):
+        pass
+
+
+class LegacyController(Controller):
+    """Controller resolving versioned methods on every attribute access."""
+
+    def __getattribute__(self, key):
+
+        def version_select(*args, **kwargs):
+            if len(args) == 0:
+                ver = kwargs['req'].api_version_request
+            else:
+                ver = args[0].api_version_request
+
+            func_list = self.versioned_methods[key]
+            for func in func_list:
+                if ver.matches(func.start_version, func.end_version):
+                    functools.update_wrapper(version_select, func.func)
+                    return func.func(self, *args, **kwargs)
+            raise exception.VersionNotFoundForAPIMethod(version=ver)
+
+        try:
+            version_meth_dict = object.__getattribute__(self,
+                                                        'versioned_methods')
+        except AttributeError:
+            return object.__getattribute__(self, key)
+
+        if version_meth_dict and key in version_meth_dict:
+            return version_select
+
+        return object.__getattribute__(self, key)
+
+
+def uncompiled_get_method(resource, request, action, content_type, body):
+    """The lookup Resource.get_method made before the dispatch table."""
+    try:
+        meth = getattr(resource.controller, action)
+    except AttributeError:
+        if action != 'action':
+            raise
+        mtype = wsgi.get_media_map().get(content_type)
+        action_name = resource.action_peek[mtype](body)
+        return (resource.wsgi_actions[action_name],
+                list(resource.wsgi_action_extensions.get(action_name, ())))
+    return meth, list(resource.wsgi_extensions.get(action, ()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    request = wsgi.Request.blank('/')
+    request.api_version_request = api_version.APIVersionRequest('2.1')
+    resource = wsgi.ResourceV21(Controller())
+    legacy_resource = wsgi.ResourceV21(LegacyController())
+    legacy = legacy_resource.controller
+    controller = resource.controller
+    body = '{"reboot": {"type": "SOFT"}}'
+
+    # Equal bodies of their own, so that each call decodes its body again
+    # as a new request would.
+    bodies = itertools.cycle([body, body + ' '])
+
+    cases = [
+        ('plain method',
+         lambda: uncompiled_get_method(legacy_resource, request, 'index',
+                                       'application/json', ''),
+         lambda: resource.get_method(request, 'index',
+                                     'application/json', '')),
+        ('body action',
+         lambda: uncompiled_get_method(legacy_resource, request,
+                                       'action', 'application/json',
+                                       next(bodies)),
+         lambda: resource.get_method(request, 'action',
+                                     'application/json', next(bodies))),
+        ('versioned method',
+         lambda: getattr(legacy, 'show')(request, 'id'),
+         lambda: resource.get_method(request, 'show', 'application/json',
+                                     '')[0](request, 'id')),
+        ('controller attribute',
+         lambda: legacy.compute_api,
+         lambda: controller.compute_api),
+    ]
+
+    print('%-22s %14s %14s' % ('lookup', 'before (us)', 'after (us)'))
+    for name, before, after in cases:
+        # The best of a few runs is the least disturbed by the machine.
+        before_us = min(timeit.repeat(before, number=args.number, repeat=5))
+        after_us = min(timeit.repeat(after, number=args.number, repeat=5))
+        print('%-22s %14.3f %14.3f' % (name,
+                                       before_us * 1e6 / args.number,
+                                       after_us * 1e6 / args.number))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Microbenchmark of the JSON libraries selectable by dalek.jsoncodec.
+
+Encodes and decodes a server detail listing of representative servers
+with every library installed, and a server action body.
+
+    python tools/benchmarks/jsoncodec.py [-n NUMBER] [-s SERVERS]
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+import uuid
+
+from dalek import jsoncodec
+
+
+def make_server(index):
+    server_id = str(uuid.uuid4())
+    link = 'http://adaptor:8774/v2/6f70656e737461636b20342065766572/servers'
+    return {
+        'id': server_id,
+        'name': u'server-%d-\u00e9t\u00e9' % index,
+        'status': 'ACTIVE',
+        'tenant_id': '6f70656e737461636b20342065766572',
+        'user_id': 'fake',
+        'created': '2015-02-11T16:32:47Z',
+        'updated': '2015-02-11T16:33:05Z',
+        'hostId': 'bd1ed7b2e7dc0bb5df4d9b2e3b3bc1fb1e3c3ea1a92d3b5a4de6',
+        'accessIPv4': '',
+        'accessIPv6': '',
+        'progress': 0,
+        'key_name': None,
+        'config_drive': '',
+        'metadata': {'role': 'web', 'index': str(index)},
+        'image': {'id': '70a599e0-31e7-49b7-b260-868f441e862b',
+                  'links': [{'href': 'http://glance/images/70a5',
+                             'rel': 'bookmark'}]},
+        'flavor': {'id': '1',
+                   'links': [{'href': 'http://adaptor/flavors/1',
+                              'rel': 'bookmark'}]},
+        'addresses': {'private': [
+            {'addr': '192.168.0.%d' % (index % 250 + 2), 'version': 4,
+             'OS-EXT-IPS:type': 'fixed',
+             'OS-EXT-IPS-MAC:mac_addr': 'fa:16:3e:4c:2c:30'}]},
+        'links': [{'href': '%s/%s' % (link, server_id), 'rel': 'self'},
+                  {'href': '%s/%s' % (link, server_id), 'rel': 'bookmark'}],
+        'OS-EXT-STS:vm_state': 'active',
+        'OS-EXT-STS:task_state': None,
+        'OS-EXT-STS:power_state': 1,
+        'OS-EXT-AZ:availability_zone': 'nova',
+        'os-extended-volumes:volumes_attached': [],
+        'security_groups': [{'name': 'default'}],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--number', type=int, default=200)
+    parser.add_argument('-s', '--servers', type=int, default=1000)
+    args = parser.parse_args()
+
+    listing = {'servers': [make_server(index)
+                           for index in range(args.servers)]}
+    action = {'reboot': {'type': 'SOFT'}}
+    encoded = jsoncodec.jsonutils.dumps(listing)
+    encoded_action = jsoncodec.jsonutils.dumps(action)
+
+    print('%d servers, %d bytes' % (args.servers, len(encoded)))
+    print('%-12s %-8s %16s %16s' % ('library', 'op', 'listing (ms)',
+                                    'action (us)'))
+    codecs = ([('encode', name, func) for name, func in jsoncodec._ENCODERS
+               if func] +
+              [('decode', name, func) for name, func in jsoncodec._DECODERS
+               if func])
+    for operation, name, func in codecs:
+        if operation == 'encode':
+            payload, small = listing, action
+        else:
+            payload, small = encoded, encoded_action
+        # The best of a few runs is the least disturbed by the machine.
+        listing_s = min(timeit.repeat(lambda: func(payload),
+                                      number=args.number, repeat=3))
+        action_s = min(timeit.repeat(lambda: func(small),
+                                     number=args.number * 100, repeat=3))
+        print('%-12s %-8s %16.3f %16.3f' % (
+            name, operation,
+            listing_s * 1e3 / args.number,
+            action_s * 1e6 / (args.number * 100)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Microbenchmark of the API middleware pipeline, nested and flattened.
+
+Sends a server show request through FaultWrapper, AdaptorContext and a
+router, as paste nests them and as pipeline.flatten() runs them, and
+counts the webob requests built for each call.  Times are the best of
+the repeats.
+
+    python tools/benchmarks/pipeline.py [-n NUMBER] [-r REPEAT]
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import webob
+
+from dalek.api import auth
+from dalek.api import openstack
+from dalek.api.openstack import wsgi
+from dalek.api import pipeline
+from dalek import wsgi as base_wsgi
+
+PROJECT = '6f70656e737461636b20342065766572'
+SERVER = '2ce4c5b3-2866-4972-93ce-77a2ea46a7f9'
+
+
+class ServersController(wsgi.Controller):
+    def show(self, req, id):
+        return {'server': {'id': id, 'name': 'server', 'status': 'ACTIVE'}}
+
+
+class Router(base_wsgi.Router):
+    def __init__(self):
+        mapper = openstack.ProjectMapper()
+        mapper.resource("server", "servers",
+                        controller=wsgi.Resource(ServersController()))
+        super(Router, self).__init__(mapper)
+        openstack._compile_routes(self)
+
+
+def build_app():
+    return openstack.FaultWrapper(auth.AdaptorContext(Router()))
+
+
+def count_requests(func):
+    """Return the number of webob requests built by func()."""
+    counter = [0]
+    init = webob.Request.__init__
+
+    def counting_init(self, *args, **kwargs):
+        counter[0] += 1
+        init(self, *args, **kwargs)
+
+    webob.Request.__init__ = counting_init
+    try:
+        func()
+    finally:
+        webob.Request.__init__ = init
+    return counter[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--number', type=int, default=20000)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = '/%s/servers/%s' % (PROJECT, SERVER)
+    headers = {'X_USER_ID': 'fake', 'X_PROJECT_ID': PROJECT,
+               'Accept': 'application/json'}
+
+    print('%-10s %12s %10s' % ('pipeline', 'time (us)', 'requests'))
+    for name, app in (('nested', build_app()),
+                      ('flattened', pipeline.flatten(build_app()))):
+        def call():
+            response = webob.Request.blank(path,
+                                           headers=headers).get_response(app)
+            assert response.status_int == 200, response.body
+
+        requests = count_requests(call) - 1
+        elapsed = min(timeit.repeat(call, number=args.number,
+                                    repeat=args.repeat))
+        print('%-10s %12.3f %10d' % (name, elapsed * 1e6 / args.number,
+                                     requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Microbenchmark of request routing, with the mapper and with the trie.
+
+Matches requests against the server routes plus an increasing number of
+extension resources, with routes.Mapper and with pathtrie.TrieRouter.
+
+    python tools/benchmarks/routing.py [-n NUMBER]
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from dalek.api import openstack
+from dalek.api.openstack import pathtrie
+
+PROJECT = '6f70656e737461636b20342065766572'
+SERVER = '2ce4c5b3-2866-4972-93ce-77a2ea46a7f9'
+
+
+def build_mapper(extensions):
+    mapper = openstack.ProjectMapper()
+    controller = object()
+    mapper.connect("server_reservation",
+                   "/{project_id}/servers/reservations/{id}",
+                   controller=controller, action='show_reservation',
+                   conditions={"method": ['GET']})
+    mapper.resource("server", "servers", controller=controller,
+                    collection={'detail': 'GET'},
+                    member={'action': 'POST', 'watch': 'GET'})
+    for index in range(extensions):
+        collection = 'os-extension-%d' % index
+        mapper.resource(collection, collection, controller=controller,
+                        member={'action': 'POST'})
+    return mapper
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    requests = [
+        ('GET', '/%s/servers/detail' % PROJECT),
+        ('GET', '/%s/servers/%s' % (PROJECT, SERVER)),
+        ('POST', '/%s/servers/%s/action' % (PROJECT, SERVER)),
+    ]
+
+    print('%-12s %-8s %-32s %12s %12s' % ('extensions', 'method', 'path',
+                                          'mapper (us)', 'trie (us)'))
+    for extensions in (0, 25, 50, 100):
+        mapper = build_mapper(extensions)
+        trie = pathtrie.TrieRouter.compile(mapper, None)
+        last = 'os-extension-%d' % (extensions - 1)
+        cases = requests + ([('POST', '/%s/%s/1/action' % (PROJECT, last))]
+                            if extensions else [])
+        for method, path in cases:
+            environ = {'PATH_INFO': path, 'REQUEST_METHOD': method}
+            expected = mapper.routematch(environ=environ)[0]
+            actual = trie.match(path, method)
+            assert expected == actual, (expected, actual)
+
+            before = timeit.timeit(
+                lambda: mapper.routematch(environ=environ),
+                number=args.number)
+            after = timeit.timeit(lambda: trie.match(path, method),
+                                  number=args.number)
+            print('%-12d %-8s %-32s %12.3f %12.3f' % (
+                extensions, method, path.replace(PROJECT, '<p>')[:32],
+                before * 1e6 / args.number, after * 1e6 / args.number))
+
+
+if __name__ == '__main__':
+    main()